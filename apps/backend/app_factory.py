@@ -6,14 +6,22 @@ Creates read, write, or operations app based on config
 import logging
 import os
 
-from database import db, migrate
+from cors import init_cors
+from database import db, engine_options, migrate
 from dotenv import load_dotenv
 from flask import Flask
-from flask_cors import CORS
+from serialization import OrjsonProvider
+from upload_stream import MAX_UPLOAD_REQUEST_SIZE, UploadRequest
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 load_dotenv()
 
+# Configured once at import. Inside create_app it ran again on every call, and
+# the test suite calls create_app once per test.
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
 
 APP_CONFIGS = {
     "read": {
@@ -49,6 +57,7 @@ def create_app(app_type="read"):
     config = APP_CONFIGS[app_type]
 
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
 
     # These processes always sit behind the nginx in supervisord.conf, which
     # proxies over loopback. Without this, request.remote_addr is 127.0.0.1 for
@@ -57,6 +66,11 @@ def create_app(app_type="read"):
     # proxy hop, so the counts are 1.
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
+    # Uploaded files are hashed as they are spooled, and a body past the upload
+    # limit stops being read as soon as it crosses it.
+    app.request_class = UploadRequest
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_REQUEST_SIZE
+
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
     database_uri = os.getenv("DATABASE_URL", "sqlite:///app.db")
 
@@ -70,18 +84,8 @@ def create_app(app_type="read"):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-    if "cockroachdb" in database_uri:
-        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-            "pool_size": 10,
-            "max_overflow": 20,
-            "pool_pre_ping": True,
-            "pool_recycle": 300,
-        }
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_uri)
+
     logger = logging.getLogger(__name__)
     logger.info(
         "[%s] Starting on port %s",
@@ -94,14 +98,18 @@ def create_app(app_type="read"):
 
     # Only enable CORS in development (production uses nginx for CORS)
     if os.getenv("FLASK_ENV") != "production":
-        CORS(app)
-
-    with app.app_context():
-        try:
-            db.session.execute(db.text("SELECT 1"))
-            logger.info("[OK] Database connection successful (%s)", config["name"])
-        except Exception as e:
-            logger.error("[ERROR] Database connection failed: %s", str(e))
+        init_cors(app)
+
+    # A round trip to the database on every create_app call, purely to log
+    # whether it worked. Worth it when a service boots, not for tooling and test
+    # fixtures that build apps repeatedly, which can switch it off.
+    if os.getenv("APP_STARTUP_DB_CHECK", "1") == "1":
+        with app.app_context():
+            try:
+                db.session.execute(db.text("SELECT 1"))
+                logger.info("[OK] Database connection successful (%s)", config["name"])
+            except Exception as e:
+                logger.error("[ERROR] Database connection failed: %s", str(e))
 
     # Dynamic blueprint import
     blueprint_module = __import__(config["blueprint_module"])
@@ -111,10 +119,29 @@ def create_app(app_type="read"):
     return app
 
 
+def __getattr__(name):
+    # "app_factory:application" for WSGI servers that import an app object
+    # rather than call a factory. Built on first access, not at import, so that
+    # importing this module for create_app does not also build an app.
+    if name == "application":
+        app = create_app(os.getenv("APP_TYPE", "read"))
+        globals()["application"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     import sys
 
+    # The Werkzeug server is for development only. Production runs each app
+    # under bjoern, behind nginx, via run_bjoern.py.
+    if os.getenv("FLASK_ENV") == "production":
+        raise SystemExit("Refusing to start the development server in production. Use: python run_bjoern.py <app_type>")
+
+    # python app_factory.py [app_type] [port]
     app_type = sys.argv[1] if len(sys.argv) > 1 else "read"
     app = create_app(app_type)
-    port = int(os.getenv("PORT", APP_CONFIGS[app_type]["default_port"]))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    port = int(sys.argv[2] if len(sys.argv) > 2 else os.getenv("PORT", APP_CONFIGS[app_type]["default_port"]))
+    # Threaded so one slow request does not hold up the rest. No reloader, which
+    # runs the app in a second process and restarts it on every file save.
+    app.run(host="0.0.0.0", port=port, threaded=True, use_reloader=False)
@@ -1,25 +1,99 @@
 """Auth0 authentication utilities for Flask API"""
 
-import json
+import logging
 import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from functools import wraps
-from urllib.request import Request, urlopen
 
+import requests
+from auth_cache import TTLCache, remaining_lifetime, token_key
 from flask import g, jsonify, request
-from jose import jwt
+from jose import jwk, jwt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
 
 AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
 API_AUDIENCE = os.getenv("AUTH0_AUDIENCE")
 ALGORITHMS = ["RS256"]
 AUTH0_TIMEOUT = float(os.getenv("AUTH0_TIMEOUT", "5"))
+AUTH0_CONNECT_TIMEOUT = float(os.getenv("AUTH0_CONNECT_TIMEOUT", "2"))
 
 # The two Auth0 endpoints are overridable so the end to end suite can point them
 # at a local issuer. That is what replaced TEST_MODE: instead of switching
 # verification off, the tests bring their own issuer and the real verification
 # path runs unchanged against it.
-AUTH0_JWKS_URL = os.getenv("AUTH0_JWKS_URL") or f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-AUTH0_USERINFO_URL = os.getenv("AUTH0_USERINFO_URL") or f"https://{AUTH0_DOMAIN}/userinfo"
-AUTH0_ISSUER = os.getenv("AUTH0_ISSUER") or f"https://{AUTH0_DOMAIN}/"
+_AUTH0_BASE = f"https://{AUTH0_DOMAIN}" if AUTH0_DOMAIN else None
+AUTH0_JWKS_URL = os.getenv("AUTH0_JWKS_URL") or (_AUTH0_BASE and f"{_AUTH0_BASE}/.well-known/jwks.json")
+AUTH0_USERINFO_URL = os.getenv("AUTH0_USERINFO_URL") or (_AUTH0_BASE and f"{_AUTH0_BASE}/userinfo")
+AUTH0_ISSUER = os.getenv("AUTH0_ISSUER") or (_AUTH0_BASE and f"{_AUTH0_BASE}/")
+
+# Without a domain the URLs above used to become https://None/..., and every
+# request paid for a DNS lookup of "None" before failing. Now an unconfigured
+# process rejects tokens without touching the network. It is not an import
+# error because migrations and other tooling import this module with no Auth0
+# settings at all.
+AUTH0_CONFIGURED = bool(AUTH0_JWKS_URL and AUTH0_ISSUER)
+if not AUTH0_CONFIGURED:
+    logger.warning("AUTH0_DOMAIN is not set: every authenticated request will be rejected")
+
+# Auth0 rotates signing keys rarely and announces new ones in the JWKS before
+# using them, so the key set is cached per process. Fetching it on every request
+# put a blocking round trip to Auth0 in front of every authenticated call.
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "300"))
+# A token naming an unknown kid forces a refresh, since that is how a rotation
+# shows up. The floor stops a stream of made up kids from turning into a stream
+# of requests to Auth0.
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "10"))
+# Auth0 publishes two or three keys. The cap only matters if the endpoint ever
+# returns something else, and keeps that from becoming unbounded memory.
+JWKS_CACHE_MAX = 32
+
+# One pooled session for every call to Auth0, so the TLS handshake is paid once
+# per connection rather than once per request. Both calls are GETs, which makes
+# retrying a gateway error safe.
+_AUTH0_SESSION = requests.Session()
+_AUTH0_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=50,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=["GET"]),
+    ),
+)
+
+
+def _auth0_get(url, **kwargs):
+    # Timeout is not optional. Without one a slow Auth0 or a bad AUTH0_DOMAIN
+    # stops being an error and becomes a hang that occupies the worker process
+    # until something else kills it.
+    response = _AUTH0_SESSION.get(url, timeout=(AUTH0_CONNECT_TIMEOUT, AUTH0_TIMEOUT), **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+# last_login is written at most this often per user. It was written on every
+# authenticated request, a write transaction per read for a field nobody looks
+# at with sub-minute precision.
+LAST_LOGIN_INTERVAL = timedelta(seconds=int(os.getenv("LAST_LOGIN_INTERVAL", "300")))
+
+# retry_at holds off the next refresh while one is in flight, and for
+# JWKS_MIN_REFRESH_INTERVAL after one fails.
+_JWKS_CACHE = {"keys_by_kid": {}, "fetched_at": 0.0, "last_refresh_at": 0.0, "retry_at": 0.0}
+# Reentrant: the first fetch stores its result while still holding it
+_JWKS_LOCK = threading.RLock()
+
+# Payloads of tokens that already passed verification. Entries never outlive the
+# token's own exp claim, so an expired token is never served from here.
+# Failures are never stored, only payloads that verified. The size bound is per
+# worker process, at roughly 2 KB a payload.
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+TOKEN_CACHE_MAX = int(os.getenv("JWT_CACHE_MAX", "10000"))
+_VERIFIED_TOKENS = TTLCache(maxsize=TOKEN_CACHE_MAX, ttl=JWT_CACHE_TTL)
 
 # There is deliberately no test or development mode in this module. An earlier
 # version skipped verification entirely when TEST_MODE was set, guarded by a
@@ -29,6 +103,11 @@ AUTH0_ISSUER = os.getenv("AUTH0_ISSUER") or f"https://{AUTH0_DOMAIN}/"
 # anyone on the internet.
 
 
+# The scheme is case insensitive (RFC 6750), and the header is exactly the scheme
+# and one token, with any whitespace around them.
+_BEARER_RE = re.compile(r"^\s*bearer\s+(\S+)\s*$", re.IGNORECASE)
+
+
 class AuthError(Exception):
     """Custom Auth Error"""
 
@@ -37,22 +116,12 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
-def get_token_auth_header():
-    """Obtains the Access Token from the Authorization Header"""
-    auth = request.headers.get("Authorization", None)
-    if not auth:
-        raise AuthError(
-            {
-                "code": "authorization_header_missing",
-                "description": "Authorization header is expected",
-            },
-            401,
-        )
-
+def _invalid_bearer_header(auth):
+    """The AuthError describing why auth is not a usable Bearer header"""
     parts = auth.split()
 
-    if parts[0].lower() != "bearer":
-        raise AuthError(
+    if not parts or parts[0].lower() != "bearer":
+        return AuthError(
             {
                 "code": "invalid_header",
                 "description": "Authorization header must start with Bearer",
@@ -60,35 +129,133 @@ def get_token_auth_header():
             401,
         )
     elif len(parts) == 1:
-        raise AuthError({"code": "invalid_header", "description": "Token not found"}, 401)
-    elif len(parts) > 2:
+        return AuthError({"code": "invalid_header", "description": "Token not found"}, 401)
+    return AuthError(
+        {
+            "code": "invalid_header",
+            "description": "Authorization header must be Bearer token",
+        },
+        401,
+    )
+
+
+def get_token_auth_header():
+    """Obtains the Access Token from the Authorization Header"""
+    auth = request.headers.get("Authorization", None)
+    if not auth:
         raise AuthError(
             {
-                "code": "invalid_header",
-                "description": "Authorization header must be Bearer token",
+                "code": "authorization_header_missing",
+                "description": "Authorization header is expected",
             },
             401,
         )
 
-    token = parts[1]
-    return token
+    # One match on the path every request takes. Working out which error to
+    # report is left to the failure path.
+    match = _BEARER_RE.match(auth)
+    if not match:
+        raise _invalid_bearer_header(auth)
+
+    return match.group(1)
+
+
+def _fetch_jwks():
+    """Download the key set and build a public key object for each kid
+
+    The key objects are built here, once per fetch, rather than handing jwt.decode
+    a JWK dict on every request and having it decode the modulus and exponent
+    and instantiate the same RSA key again each time.
+    """
+    jwks = _auth0_get(AUTH0_JWKS_URL)
+
+    keys_by_kid = {}
+    for key in jwks["keys"]:
+        if len(keys_by_kid) >= JWKS_CACHE_MAX:
+            break
+        if "kid" not in key or key.get("kty") != "RSA":
+            continue
+        try:
+            keys_by_kid[key["kid"]] = jwk.construct(
+                {"kty": key["kty"], "kid": key["kid"], "use": key.get("use"), "n": key["n"], "e": key["e"]},
+                ALGORITHMS[0],
+            )
+        except Exception:
+            # One malformed entry must not take the rest of the key set with it.
+            continue
+    return keys_by_kid
+
+
+def _get_jwks(kid):
+    """Return the cached key for kid, refreshing the key set when needed.
+
+    Returns None when the key set, freshly fetched or not, has no such kid. That
+    fails closed: the caller rejects the token.
+
+    Once there are keys, the refresh runs outside the lock, and other requests
+    go on using the keys already held until it finishes. If it fails, those
+    keys stay in use and the next attempt waits JWKS_MIN_REFRESH_INTERVAL, so an
+    Auth0 outage neither queues every request behind a fetch nor sends one
+    fetch per request. Only the very first fetch, with nothing to serve
+    meanwhile, is made under the lock and raises when it fails.
+    """
+    with _JWKS_LOCK:
+        now = time.monotonic()
+        keys_by_kid = _JWKS_CACHE["keys_by_kid"]
+        expired = now - _JWKS_CACHE["fetched_at"] >= JWKS_CACHE_TTL
+        missing = kid not in keys_by_kid
+
+        if now < _JWKS_CACHE["retry_at"] or not (
+            expired or (missing and now - _JWKS_CACHE["last_refresh_at"] >= JWKS_MIN_REFRESH_INTERVAL)
+        ):
+            return keys_by_kid.get(kid)
+
+        _JWKS_CACHE["last_refresh_at"] = now
+        _JWKS_CACHE["retry_at"] = now + JWKS_MIN_REFRESH_INTERVAL
+        if not keys_by_kid:
+            return _refresh_jwks(now, raise_on_error=True).get(kid)
+
+    return _refresh_jwks(now).get(kid)
+
+
+def _refresh_jwks(now, raise_on_error=False):
+    """Fetch the key set into the cache, returning the keys to use."""
+    try:
+        keys_by_kid = _fetch_jwks()
+    except Exception as e:
+        if raise_on_error:
+            raise
+        logger.warning("JWKS refresh failed, keeping the cached keys: %s", str(e))
+        return _JWKS_CACHE["keys_by_kid"]
+
+    with _JWKS_LOCK:
+        _JWKS_CACHE["keys_by_kid"] = keys_by_kid
+        _JWKS_CACHE["fetched_at"] = now
+        _JWKS_CACHE["retry_at"] = 0.0
+    return keys_by_kid
 
 
 def verify_decode_jwt(token):
     """Verifies and decodes JWT token from Auth0"""
-    # Timeout is not optional. This runs on every authenticated request, and
-    # urlopen without one waits indefinitely, so a slow Auth0 or a bad
-    # AUTH0_DOMAIN stops being an error and becomes a hang that occupies the
-    # worker process until something else kills it.
-    jsonurl = urlopen(AUTH0_JWKS_URL, timeout=AUTH0_TIMEOUT)
-    jwks = json.loads(jsonurl.read())
+    if not AUTH0_CONFIGURED:
+        raise AuthError({"code": "auth_not_configured", "description": "Authentication is not configured"}, 500)
+
+    cache_key = token_key(token)
+    payload = _VERIFIED_TOKENS.get(cache_key)
+    if payload is not None:
+        lifetime = remaining_lifetime(payload)
+        if lifetime is None or lifetime > 0:
+            return payload
 
     try:
         unverified_header = jwt.get_unverified_header(token)
     except jwt.JWTError as e:
         raise AuthError({"code": "invalid_header", "description": f"Invalid header: {str(e)}"}, 401)
 
-    if unverified_header.get("alg") == "HS256":
+    # Everything that can be rejected from the header alone is rejected before the
+    # key set is consulted, so a probe with "alg": "HS256" or "none", or with no
+    # kid at all, never costs a JWKS refresh.
+    if unverified_header.get("alg") not in ALGORITHMS:
         raise AuthError(
             {
                 "code": "invalid_header",
@@ -97,19 +264,12 @@ def verify_decode_jwt(token):
             401,
         )
 
-    rsa_key = {}
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"],
-            }
-            break
+    if not unverified_header.get("kid"):
+        raise AuthError({"code": "invalid_header", "description": "Unable to find appropriate key"}, 401)
+
+    rsa_key = _get_jwks(unverified_header["kid"])
 
-    if rsa_key:
+    if rsa_key is not None:
         try:
             # Decode with or without audience based on whether API_AUDIENCE is set
             decode_options = {
@@ -120,6 +280,7 @@ def verify_decode_jwt(token):
                 decode_options["audience"] = API_AUDIENCE
 
             payload = jwt.decode(token, rsa_key, **decode_options)
+            _VERIFIED_TOKENS.set(cache_key, payload, remaining_lifetime(payload))
             return payload
         except jwt.ExpiredSignatureError:
             raise AuthError({"code": "token_expired", "description": "Token is expired"}, 401)
@@ -154,6 +315,8 @@ def requires_auth(f):
             g.current_user_auth0_id = payload.get("sub")
             g.current_user_email = payload.get("email")
             g.current_user_name = payload.get("name")
+            # Resolved from the new identity by get_or_create_user on demand.
+            g.pop("current_user", None)
         except AuthError as e:
             return jsonify(e.error), e.status_code
         except Exception as e:
@@ -165,7 +328,15 @@ def requires_auth(f):
 
 
 def get_or_create_user(db, User):
-    """Get or create user from Auth0 token payload"""
+    """Get or create user from Auth0 token payload
+
+    Looked up once per request and kept on g, so a handler, or anything it
+    calls, can ask again without another query.
+    """
+    user = g.get("current_user")
+    if user is not None:
+        return user
+
     auth0_id = g.current_user_auth0_id
 
     user = User.query.filter_by(auth0_id=auth0_id).first()
@@ -173,12 +344,10 @@ def get_or_create_user(db, User):
     if not user:
         # Get user info from Auth0 userinfo endpoint
         try:
+            if not AUTH0_USERINFO_URL:
+                raise ValueError("AUTH0_USERINFO_URL is not configured")
             token = get_token_auth_header()
-            req = Request(AUTH0_USERINFO_URL)
-            req.add_header("Authorization", f"Bearer {token}")
-
-            userinfo_response = urlopen(req, timeout=AUTH0_TIMEOUT)
-            userinfo = json.loads(userinfo_response.read())
+            userinfo = _auth0_get(AUTH0_USERINFO_URL, headers={"Authorization": f"Bearer {token}"})
 
             email = userinfo.get("email")
             name = userinfo.get("name") or userinfo.get("nickname") or email
@@ -194,10 +363,18 @@ def get_or_create_user(db, User):
         db.session.add(user)
         db.session.commit()
     else:
-        # Update last login
-        user.last_login = db.func.current_timestamp()
-        db.session.commit()
-
+        # The stored timestamps are naive UTC, from the database's clock.
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - LAST_LOGIN_INTERVAL
+        if user.last_login is None or user.last_login < cutoff:
+            # Conditional in SQL as well, so concurrent requests from the same
+            # user cannot all decide to write.
+            User.query.filter(
+                User.id == user.id,
+                db.or_(User.last_login.is_(None), User.last_login < cutoff),
+            ).update({"last_login": db.func.current_timestamp()}, synchronize_session=False)
+            db.session.commit()
+
+    g.current_user = user
     return user
 
 
@@ -0,0 +1,73 @@
+"""Bounded in-process cache for verified access tokens.
+
+A client reuses the same Auth0 access token for every call it makes until the
+token expires, and each of those calls used to pay for a full RS256 signature
+check. Verifying a given token always produces the same payload, so the payload
+is kept and the check is skipped the next time the token is presented.
+
+Only a SHA-256 digest of the token is stored, never the token itself, so the
+cache holds nothing that could be replayed if the process memory were read.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """A size bounded LRU mapping whose entries also expire.
+
+    Both bounds matter. The TTL keeps a revoked or rotated credential from living
+    on in the cache, and the size bound keeps a caller spraying unique tokens from
+    growing the process without limit.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for at most ttl seconds, capped at the cache's own TTL."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def token_key(token):
+    """The cache key for a raw bearer token."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def remaining_lifetime(payload):
+    """Seconds until the token's exp claim, or None when it has none."""
+    exp = payload.get("exp")
+    if exp is None:
+        return None
+    return exp - time.time()
@@ -0,0 +1,42 @@
+"""CORS headers for development.
+
+In production nginx answers CORS and these processes never see it. This covers
+running the apps directly, where the frontend dev server is a different origin.
+It replaces flask-cors, which dispatched hooks and matched origin patterns on
+every request to deliver what here is a fixed set of headers.
+"""
+
+import os
+
+from flask import request
+
+ALLOW_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+
+def init_cors(app, origins=None):
+    """Answer cross origin requests from origins, or from any origin when unset.
+
+    origins defaults to the comma separated CORS_ORIGINS environment variable.
+    Preflights need no route of their own: Flask already answers OPTIONS on
+    every rule, and the headers are added to that answer like any other.
+    """
+    if origins is None:
+        origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()]
+    allowed = frozenset(origins) or None
+
+    @app.after_request
+    def add_cors_headers(response):
+        origin = request.headers.get("Origin")
+        if not origin or (allowed is not None and origin not in allowed):
+            return response
+
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.vary.add("Origin")
+        if request.method == "OPTIONS":
+            response.headers["Access-Control-Allow-Methods"] = ALLOW_METHODS
+            requested_headers = request.headers.get("Access-Control-Request-Headers")
+            if requested_headers:
+                response.headers["Access-Control-Allow-Headers"] = requested_headers
+        return response
+
+    return app
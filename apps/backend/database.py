@@ -1,5 +1,35 @@
+import os
+
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.pool import StaticPool
 
 db = SQLAlchemy()
 migrate = Migrate()
+
+
+def engine_options(database_uri):
+    """SQLAlchemy engine options for a database URI.
+
+    Every backend gets a sized pool with pre-ping, not only CockroachDB. Without
+    pre-ping a connection the server or a load balancer has dropped is handed
+    to a request, which fails with a 500 instead of reconnecting.
+    """
+    if database_uri.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        # Each connection to an in-memory database gets its own empty database,
+        # so there must only ever be one.
+        if ":memory:" in database_uri or database_uri in ("sqlite://", "sqlite:///"):
+            options["poolclass"] = StaticPool
+        return options
+
+    # CockroachDB's guidance is short connection lifetimes, so that connections
+    # rebalance across nodes. Plain Postgres can keep them for longer.
+    default_recycle = 300 if "cockroachdb" in database_uri else 1800
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", default_recycle)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
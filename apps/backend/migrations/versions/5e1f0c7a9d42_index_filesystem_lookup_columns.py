@@ -0,0 +1,33 @@
+"""Index filesystem lookup columns
+
+Revision ID: 5e1f0c7a9d42
+Revises: b225026a15be
+Create Date: 2026-10-14 10:12:03.118204
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e1f0c7a9d42"
+down_revision = "b225026a15be"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.create_index("ix_fsi_owner_parent", ["owner_id", "parent_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_filesystem_items_parent_id"), ["parent_id"], unique=False)
+
+    with op.batch_alter_table("file_permissions", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_file_permissions_user_id"), ["user_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("file_permissions", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_file_permissions_user_id"))
+
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_filesystem_items_parent_id"))
+        batch_op.drop_index("ix_fsi_owner_parent")
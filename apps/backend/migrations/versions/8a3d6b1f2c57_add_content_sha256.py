@@ -0,0 +1,28 @@
+"""Add content_sha256 to filesystem items
+
+Revision ID: 8a3d6b1f2c57
+Revises: 5e1f0c7a9d42
+Create Date: 2026-10-14 18:41:27.530912
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8a3d6b1f2c57"
+down_revision = "5e1f0c7a9d42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("content_sha256", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_fsi_owner_sha256", ["owner_id", "content_sha256"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.drop_index("ix_fsi_owner_sha256")
+        batch_op.drop_column("content_sha256")
@@ -0,0 +1,79 @@
+"""Keep item names unique at the root
+
+Revision ID: c4e7a2d91b30
+Revises: 8a3d6b1f2c57
+Create Date: 2026-10-14 18:40:27.506113
+
+"""
+
+import logging
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger("alembic.env")
+
+# revision identifiers, used by Alembic.
+revision = "c4e7a2d91b30"
+down_revision = "8a3d6b1f2c57"
+branch_labels = None
+depends_on = None
+
+# Root names were never kept unique before this revision, so a database can
+# already hold duplicates the index would refuse. The oldest item keeps its name
+# and the others get their id appended, "report.pdf (42)", trimmed to fit the
+# 255 characters of the column.
+RENAME_DUPLICATE_ROOT_NAMES = sa.text(
+    """
+    UPDATE filesystem_items
+    SET name = SUBSTR(name, 1, 252 - LENGTH(CAST(id AS TEXT))) || ' (' || CAST(id AS TEXT) || ')'
+    WHERE parent_id IS NULL
+    AND EXISTS (
+        SELECT 1 FROM filesystem_items AS earlier
+        WHERE earlier.parent_id IS NULL
+        AND earlier.owner_id = filesystem_items.owner_id
+        AND earlier.name = filesystem_items.name
+        AND earlier.id < filesystem_items.id
+    )
+    """
+)
+RENAME_PASSES = 5
+DUPLICATE_ROOT_NAMES = sa.text(
+    """
+    SELECT owner_id, name FROM filesystem_items
+    WHERE parent_id IS NULL
+    GROUP BY owner_id, name
+    HAVING COUNT(*) > 1
+    """
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Repeated in case a new name is itself taken, by "report.pdf (42)" say
+    for _ in range(RENAME_PASSES):
+        renamed = bind.execute(RENAME_DUPLICATE_ROOT_NAMES).rowcount
+        if not renamed:
+            break
+        logger.info("Renamed %d items whose names repeated another item's at the root", renamed)
+    remaining = bind.execute(DUPLICATE_ROOT_NAMES).fetchall()
+    if remaining:
+        raise RuntimeError(
+            "Cannot create uq_fsi_owner_root_name, items at the root still share a name: "
+            + ", ".join(f"owner {owner_id} {name!r}" for owner_id, name in remaining)
+            + ". Rename them and run the upgrade again."
+        )
+
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.create_index(
+            "uq_fsi_owner_root_name",
+            ["owner_id", "name"],
+            unique=True,
+            postgresql_where=sa.text("parent_id IS NULL"),
+            sqlite_where=sa.text("parent_id IS NULL"),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.drop_index("uq_fsi_owner_root_name")
@@ -0,0 +1,58 @@
+"""Add the full-text and trigram search indexes
+
+Revision ID: d91f3b6a47e2
+Revises: c4e7a2d91b30
+Create Date: 2026-10-14 19:05:48.220931
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d91f3b6a47e2"
+down_revision = "c4e7a2d91b30"
+branch_labels = None
+depends_on = None
+
+# The same column and indexes scripts/migrate_content_fields.py creates, so a
+# database managed by Alembic searches through them too. On the same dialects as
+# that script's POSTGRES_DIALECTS, Postgres and CockroachDB, which both have
+# tsvector, GIN and trigram indexes. Others keep the ILIKE fallback in
+# search_files.
+POSTGRES_DIALECTS = {"postgresql", "cockroachdb"}
+INDEXES = (
+    ("idx_filesystem_content_tsv", "USING GIN (content_tsv)"),
+    ("idx_filesystem_name_trgm", "USING GIN (name gin_trgm_ops)"),
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name not in POSTGRES_DIALECTS:
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        """
+        ALTER TABLE filesystem_items
+        ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+            setweight(to_tsvector('english', COALESCE(content_text, '')), 'B')
+        ) STORED
+        """
+    )
+    # Built CONCURRENTLY so uploads keep writing while they build, which
+    # cannot happen inside the migration's transaction.
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON filesystem_items {definition}")
+
+
+def downgrade():
+    if op.get_bind().dialect.name not in POSTGRES_DIALECTS:
+        return
+
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.execute("ALTER TABLE filesystem_items DROP COLUMN IF EXISTS content_tsv")
@@ -0,0 +1,28 @@
+"""Page listings off the owner/parent index
+
+Revision ID: e3a81c5f0d64
+Revises: d91f3b6a47e2
+Create Date: 2026-10-14 19:31:12.664870
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e3a81c5f0d64"
+down_revision = "d91f3b6a47e2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The new index first, so listings are never left without one.
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.create_index("ix_fsi_owner_parent_id", ["owner_id", "parent_id", "id"], unique=False)
+        batch_op.drop_index("ix_fsi_owner_parent")
+
+
+def downgrade():
+    with op.batch_alter_table("filesystem_items", schema=None) as batch_op:
+        batch_op.create_index("ix_fsi_owner_parent", ["owner_id", "parent_id"], unique=False)
+        batch_op.drop_index("ix_fsi_owner_parent_id")
@@ -51,13 +51,19 @@ class FileSystemItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     type = db.Column(db.Enum("folder", "file", name="item_type"), nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey("filesystem_items.id"), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey("filesystem_items.id"), nullable=True, index=True)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     size = db.Column(db.BigInteger, nullable=True)
     mime_type = db.Column(db.String(100), nullable=True)
     path = db.Column(db.String(1000), nullable=True)
+    # Hex SHA-256 of a file's bytes, so a repeat upload can be recognised.
+    content_sha256 = db.Column(db.String(64), nullable=True)
     is_public = db.Column(db.Boolean, default=False)
-    content_text = db.Column(db.Text, nullable=True)
+    # The full extracted text of a PDF, easily megabytes. Deferred so that loading
+    # an item, which every listing does by the hundred, does not load this too.
+    # It is only read when set by the extractor, and searching filters on it in
+    # SQL without ever loading it into Python.
+    content_text = db.deferred(db.Column(db.Text, nullable=True))
     content_extracted = db.Column(db.Boolean, default=False)
     extraction_error = db.Column(db.String(500), nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -71,7 +77,26 @@ class FileSystemItem(db.Model):
 
     permissions = db.relationship("FilePermission", backref="item", lazy=True, cascade="all, delete-orphan")
 
-    __table_args__ = (db.UniqueConstraint("name", "parent_id", "owner_id", name="unique_name_per_location_per_owner"),)
+    # Every listing filters on owner and parent together and pages by id, which
+    # is this index, in that order, so a page is read off it already sorted
+    # rather than the whole folder fetched and sorted first. It also serves
+    # owner_id on its own, as the leading column, so owner_id has no separate
+    # index. parent_id does, for the child lookups that do not know the owner.
+    # NULL parent_ids never collide in the unique constraint, so names at the
+    # root are kept unique by a partial index of their own.
+    __table_args__ = (
+        db.UniqueConstraint("name", "parent_id", "owner_id", name="unique_name_per_location_per_owner"),
+        db.Index(
+            "uq_fsi_owner_root_name",
+            "owner_id",
+            "name",
+            unique=True,
+            postgresql_where=db.text("parent_id IS NULL"),
+            sqlite_where=db.text("parent_id IS NULL"),
+        ),
+        db.Index("ix_fsi_owner_parent_id", "owner_id", "parent_id", "id"),
+        db.Index("ix_fsi_owner_sha256", "owner_id", "content_sha256"),
+    )
 
     def to_dict(self, include_owner=False):
         data = {
@@ -83,6 +108,7 @@ class FileSystemItem(db.Model):
             "size": self.size,
             "mime_type": self.mime_type,
             "path": self.path,
+            "content_sha256": self.content_sha256,
             "is_public": self.is_public,
             "content_extracted": self.content_extracted,
             "extraction_error": self.extraction_error,
@@ -99,17 +125,122 @@ class FileSystemItem(db.Model):
 
         return data
 
+    @classmethod
+    def exists(cls, *criteria, **filters):
+        """Whether any item matches, asked as EXISTS so no row is loaded."""
+        query = cls.query.filter(*criteria).filter_by(**filters)
+        return db.session.query(query.exists()).scalar()
+
+    @classmethod
+    def row_columns(cls):
+        """The columns to_rows reads, for selecting rows without loading whole items."""
+        return (
+            cls.id,
+            cls.name,
+            cls.type,
+            cls.parent_id,
+            cls.owner_id,
+            cls.size,
+            cls.mime_type,
+            cls.path,
+            cls.content_sha256,
+            cls.is_public,
+            cls.content_extracted,
+            cls.extraction_error,
+            cls.created_at,
+            cls.updated_at,
+        )
+
+    @classmethod
+    def to_rows(cls, items):
+        """What to_dict() returns, for many items at once, ready for serialization.dumps
+
+        One comprehension rather than a method call and a dict built up key by
+        key per row. The datetimes are left as they are, for the encoder to
+        format, which produces the same text isoformat() would. items can be
+        model instances or rows selected with row_columns().
+        """
+        return [
+            {
+                "id": str(item.id),
+                "name": item.name,
+                "type": item.type,
+                "parent_id": str(item.parent_id) if item.parent_id else None,
+                "owner_id": str(item.owner_id),
+                "size": item.size,
+                "mime_type": item.mime_type,
+                "path": item.path,
+                "content_sha256": item.content_sha256,
+                "is_public": item.is_public,
+                "content_extracted": item.content_extracted,
+                "extraction_error": item.extraction_error,
+                "created_at": item.created_at,
+                "updated_at": item.updated_at,
+            }
+            for item in items
+        ]
+
     def __repr__(self):
         return f"<FileSystemItem {self.name} ({self.type})>"
 
 
+# How a name collision shows up in an IntegrityError. Postgres names the
+# constraint or index; SQLite lists the columns, which start with name for both.
+NAME_CONFLICT_MARKERS = (
+    "unique_name_per_location_per_owner",
+    "uq_fsi_owner_root_name",
+    "UNIQUE constraint failed: filesystem_items.name",
+    "UNIQUE constraint failed: filesystem_items.owner_id, filesystem_items.name",
+)
+
+
+def is_name_conflict(error):
+    """Whether an IntegrityError is an item name already taken in its folder."""
+    message = str(error)
+    return any(marker in message for marker in NAME_CONFLICT_MARKERS)
+
+
+# Looking up one of the caller's items is the first query of nearly every item
+# route. As a lambda statement it is built and its cache key computed once, not
+# put together from filter_by keywords on every request.
+_OWNED_ITEM = db.lambda_stmt(
+    lambda: db.select(FileSystemItem).where(
+        FileSystemItem.id == db.bindparam("item_id"), FileSystemItem.owner_id == db.bindparam("owner_id")
+    )
+)
+
+
+def get_owned_item(item_id, owner_id):
+    """The item with this id if owner_id owns it, else None."""
+    return db.session.execute(_OWNED_ITEM, {"item_id": item_id, "owner_id": owner_id}).scalar_one_or_none()
+
+
+def descendants_cte(root_id, owner_id, folders_only=False):
+    """A recursive CTE of the ids of root_id and everything below it.
+
+    The whole subtree comes back from one query, where walking it level by
+    level costs a round trip per folder. With folders_only only the folders are
+    followed and returned, which is all a search scoped to a folder needs.
+    """
+    items = FileSystemItem.__table__
+    anchor = db.select(items.c.id).where(items.c.id == root_id, items.c.owner_id == owner_id)
+    if folders_only:
+        anchor = anchor.where(items.c.type == "folder")
+    tree = anchor.cte("descendants", recursive=True)
+
+    step = db.select(items.c.id).join(tree, items.c.parent_id == tree.c.id).where(items.c.owner_id == owner_id)
+    if folders_only:
+        step = step.where(items.c.type == "folder")
+    return tree.union_all(step)
+
+
 class FilePermission(db.Model):
 
     __tablename__ = "file_permissions"
 
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey("filesystem_items.id"), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     permission = db.Column(
         db.Enum("read", "write", "admin", name="permission_type"),
         nullable=False,
@@ -6,6 +6,7 @@ slow response and a large allocation rather than an error, so nothing catches it
 until it matters.
 """
 
+from database import db
 from flask import request
 
 DEFAULT_LIMIT = 100
@@ -32,19 +33,40 @@ def pagination_args():
     return limit, offset
 
 
-def paginate(query, limit, offset):
+def paginate(query, limit, offset, serialize=None, columns=None):
     """Run a page of a query and describe it.
 
     Ordered by id so paging is stable. Paging an unordered query lets the
     database return rows in a different order per call, which shows the same row
     on two pages and hides another entirely.
+
+    serialize turns the page of rows into a list. It defaults to each row's
+    to_dict(). With columns, the page is fetched as plain rows of just those
+    columns, so no model instances are built only to be serialized.
     """
     total = query.order_by(None).count()
-    items = query.order_by("id").limit(limit).offset(offset).all()
+    page_query = query.with_entities(*columns) if columns else query
+    items = page_query.order_by("id").limit(limit).offset(offset).all()
     return {
-        "items": [item.to_dict() for item in items],
+        "items": serialize(items) if serialize else [item.to_dict() for item in items],
         "total": total,
         "limit": limit,
         "offset": offset,
         "has_more": offset + len(items) < total,
     }
+
+
+def count_estimate(query):
+    """The planner's estimate of how many rows query returns, or None.
+
+    Only PostgreSQL is asked. An exact count() runs the whole filter over every
+    matching row, which for a broad search is a second full pass just to fill
+    in a total. EXPLAIN reads the estimate from table statistics without
+    touching the rows.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    compiled = query.order_by(None).statement.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
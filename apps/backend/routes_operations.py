@@ -1,37 +1,38 @@
+import datetime
+import hashlib
+import io
 import logging
 import os
-from io import BytesIO
+import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 
 import requests
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, redirect, request, send_file
+from requests.adapters import HTTPAdapter
+from sqlalchemy import func, inspect, literal, literal_column, tuple_
 from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 try:
+    from google.api_core.exceptions import NotFound, RequestRangeNotSatisfiable
     from google.cloud import storage
 
     HAS_GCS = True
 except ImportError:
     HAS_GCS = False
     storage = None
-
-try:
-    import magic
-
-    HAS_MAGIC = True
-except ImportError:
-    HAS_MAGIC = False
-
-try:
-    from PyPDF2 import PdfReader
-
-    HAS_PYPDF2 = True
-except ImportError:
-    HAS_PYPDF2 = False
+    NotFound = RequestRangeNotSatisfiable = None
 
 from auth import get_or_create_user, requires_auth
 from database import db
-from models import FileSystemItem, User
-from utils import clean_pdf_filename, has_meaningful_content, is_safe_path, sanitize_filename, validate_filename
+from models import FilePermission, FileSystemItem, User, descendants_cte, get_owned_item, is_name_conflict
+from pagination import count_estimate
+from serialization import json_response
+from upload_stream import MAX_FILE_SIZE, MAX_UPLOAD_REQUEST_SIZE
+from utils import clean_pdf_filename, is_safe_path, sanitize_filename, validate_filename
 
 logger = logging.getLogger(__name__)
 
@@ -41,39 +42,98 @@ UPLOAD_FOLDER = "uploads"
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-MAX_FILE_SIZE = 100 * 1024 * 1024
-ALLOWED_EXTENSIONS = {"pdf"}
-ALLOWED_MIME_TYPES = {"application/pdf"}
+PDF_SNIFF_SIZE = 2048
+# The header may follow up to 1 KiB of leading bytes, which readers tolerate.
+PDF_HEADER_WINDOW = 1024
+PDF_HEADER_RE = re.compile(rb"%PDF-(\d\.\d)")
+PDF_TRAILER_WINDOW = 1024
+# The last startxref in the window wins, for incrementally updated files.
+PDF_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)\s+%%EOF(?![\s\S]*startxref)")
+PDF_XREF_RE = re.compile(rb"\s*(?:xref\b|\d+\s+\d+\s+obj\b)")
+PDF_VERSIONS = {b"1.0", b"1.1", b"1.2", b"1.3", b"1.4", b"1.5", b"1.6", b"1.7", b"2.0"}
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Resumable upload chunk size for GCS. Must be a multiple of 256 KiB.
+GCS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Ranged read size when streaming a download out of GCS, also 256 KiB aligned.
+GCS_DOWNLOAD_CHUNK_SIZE = 6 * 256 * 1024
+# Uploads are written on here, overlapping the commit of their row.
+STORAGE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("STORAGE_WORKERS", "8")), thread_name_prefix="storage")
+# The text extractor is told about new uploads from here, after the response.
+NOTIFY_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("NOTIFY_WORKERS", "4")), thread_name_prefix="notify")
+# Search pages past this offset report an estimated total instead of counting.
+EXACT_COUNT_MAX_OFFSET = 1000
+# How many stored files a single delete removes at once.
+DELETE_WORKERS = 16
+# Kept-alive connections to the GCS API, for the threads above and requests.
+GCS_HTTP_POOL_SIZE = int(os.getenv("GCS_HTTP_POOL_SIZE", "32"))
+# The JSON API's recommended ceiling for calls in one batch request.
+GCS_DELETE_BATCH_SIZE = 100
+# GCS downloads at least this large are redirected to a signed URL, so the bytes
+# go straight from GCS to the client. 0, the default, streams every download
+# through the backend. Signing needs credentials that can sign, and a direct
+# download from the browser needs CORS on the bucket.
+GCS_SIGNED_URL_MIN_SIZE = int(os.getenv("GCS_SIGNED_URL_MIN_SIZE", "0"))
+GCS_SIGNED_URL_TTL = datetime.timedelta(seconds=int(os.getenv("GCS_SIGNED_URL_TTL", "300")))
+ALLOWED_EXTENSIONS = frozenset({"pdf"})
+# As suffixes, so one endswith() call checks a name against all of them.
+ALLOWED_SUFFIXES = tuple(f".{extension}" for extension in ALLOWED_EXTENSIONS)
 
 
 def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
 
 
-def validate_pdf_content(file_content):
-    if not file_content.startswith(b"%PDF-"):
-        return False, "File is not a valid PDF (invalid header)"
+def validate_pdf_fast(header):
+    """Check the first bytes of an upload look like a PDF.
 
-    if HAS_MAGIC:
-        mime = magic.from_buffer(file_content[:2048], mime=True)
-        if mime != "application/pdf":
-            return False, f"File MIME type is {mime}, expected application/pdf"
+    This is all the validation the request waits for. Parsing the document,
+    counting its pages and checking it has text all happen in the text
+    extractor after the upload is committed, which records any failure in
+    extraction_error. Parsing in the request made latency grow with the size of
+    the PDF and let a crafted document tie up an API worker.
 
-    if HAS_PYPDF2:
-        try:
-            pdf_file = BytesIO(file_content)
-            reader = PdfReader(pdf_file)
-            page_count = len(reader.pages)
-            if page_count == 0:
-                return False, "PDF file appears to be empty or corrupted"
-        except Exception as e:
-            return False, f"PDF validation failed: {str(e)}"
+    PDF is the only type accepted, and the %PDF-x.y header is the signature
+    libmagic itself goes by, so there is no separate MIME sniff.
+    """
+    match = PDF_HEADER_RE.search(header, 0, PDF_HEADER_WINDOW)
+    if not match:
+        return False, "File is not a valid PDF (invalid header)"
+    if match.group(1) not in PDF_VERSIONS:
+        return False, f"Unsupported PDF version {match.group(1).decode()}"
 
     return True, "Valid PDF file"
 
 
-def validate_file_size(file_content):
-    size = len(file_content)
+def validate_pdf_trailer(stream, size):
+    """Check that a PDF ends the way one must, by reading two small windows.
+
+    The last KiB has to hold startxref, the byte offset of the cross reference
+    section, followed by %%EOF. That offset must land on either the xref
+    keyword or, since PDF 1.5, the "N G obj" of a cross reference stream. A
+    truncated upload, or something that merely starts like a PDF, fails one of
+    these without the document ever being parsed. The stream is left rewound.
+    """
+    try:
+        stream.seek(max(0, size - PDF_TRAILER_WINDOW))
+        tail = stream.read(PDF_TRAILER_WINDOW)
+        match = PDF_STARTXREF_RE.search(tail)
+        if not match:
+            return False, "File is not a valid PDF (missing startxref or %%EOF)"
+
+        offset = int(match.group(1))
+        if offset >= size:
+            return False, "File is not a valid PDF (startxref points past the end of the file)"
+
+        stream.seek(offset)
+        if not PDF_XREF_RE.match(stream.read(32)):
+            return False, "File is not a valid PDF (startxref does not point at a cross reference section)"
+    finally:
+        stream.seek(0)
+
+    return True, "Valid PDF trailer"
+
+
+def validate_file_size(size):
     if size > MAX_FILE_SIZE:
         size_mb = size / (1024 * 1024)
         max_mb = MAX_FILE_SIZE / (1024 * 1024)
@@ -81,8 +141,102 @@ def validate_file_size(file_content):
     return True, "File size OK"
 
 
+def stream_size(stream):
+    """Length of a seekable stream, without reading it."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def stream_sha256(stream):
+    """Hex SHA-256 of a seekable stream, which is left rewound."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class GCSObjectReader(io.RawIOBase):
+    """A seekable reader over a GCS object, one ranged GET per read.
+
+    Meant to sit under an io.BufferedReader, which turns that into one GET per
+    buffer fill. blob.open() needs a metadata request before it can seek; this
+    does not, because the size is already known from the database, which is
+    what lets a Range request start at its offset without reading up to it.
+    """
+
+    def __init__(self, blob, size):
+        self._blob = blob
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._size
+        self._pos = max(0, pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._size is not None and self._pos >= self._size:
+            return 0
+        try:
+            # A checksum only exists for the whole object, not a range of it.
+            data = self._blob.download_as_bytes(start=self._pos, end=self._pos + len(buffer) - 1, checksum=None)
+        except RequestRangeNotSatisfiable:
+            return 0
+        count = len(data)
+        buffer[:count] = data
+        self._pos += count
+        return count
+
+
 # Text extraction service URL (different in Docker vs local)
 TEXT_EXTRACTOR_URL = os.getenv("TEXT_EXTRACTOR_URL", "http://localhost:6004")
+# One kept-alive connection pool to the extractor, shared by the notify
+# threads and the extract route, instead of a new connection per call.
+EXTRACTOR_SESSION = requests.Session()
+EXTRACTOR_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=0))
+
+
+def notify_extractor(file_id, file_path):
+    """Queue a stored upload for text extraction.
+
+    Runs on NOTIFY_POOL, so the upload response does not wait on the extractor.
+    The file and its row are durable by the time this is called, and an upload
+    the extractor never hears about can still be queued through the extract
+    route, so failures are only logged.
+    """
+    try:
+        logger.info("Attempting to notify text extractor for file %s", file_id)
+        extraction_response = EXTRACTOR_SESSION.post(
+            f"{TEXT_EXTRACTOR_URL}/extract",
+            json={"file_id": file_id, "file_path": file_path},
+            timeout=5,
+        )
+        logger.info("Extractor response status: %s", extraction_response.status_code)
+
+        if extraction_response.status_code == 200:
+            logger.info("File %s queued for text extraction", file_id)
+        else:
+            logger.warning("Failed to queue file %s for extraction: %s", file_id, extraction_response.status_code)
+    except requests.exceptions.RequestException as e:
+        logger.error("Network error contacting text extractor: %s", str(e))
+    except Exception as e:
+        logger.error("Unexpected error notifying text extractor: %s", str(e))
+
 
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 USE_GCS = GCS_BUCKET_NAME is not None
@@ -90,6 +244,12 @@ USE_GCS = GCS_BUCKET_NAME is not None
 if USE_GCS:
     try:
         storage_client = storage.Client()
+        # The client's session keeps 10 connections per host by default, fewer
+        # than the upload and delete pools can have in flight, and every request
+        # beyond that opens, and then throws away, its own TLS connection.
+        storage_client._http.mount(
+            "https://", HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE)
+        )
         bucket = storage_client.bucket(GCS_BUCKET_NAME)
         logger.info("Google Cloud Storage initialized: %s", GCS_BUCKET_NAME)
     except Exception as e:
@@ -100,15 +260,171 @@ else:
     logger.info("Using local file storage (GCS_BUCKET_NAME not set)")
 
 
-def get_file_path(item_id, filename=None):
-    if filename and "." in filename:
-        extension = filename.rsplit(".", 1)[1]
-        base_path = (
-            f"uploads/{item_id}.{extension}" if USE_GCS else os.path.join(UPLOAD_FOLDER, f"{item_id}.{extension}")
+# The generated tsvector column that scripts/migrate_content_fields.py, or
+# Alembic revision d91f3b6a47e2, adds on Postgres. It is not mapped on the
+# model, because SQLite has no such type.
+CONTENT_TSV = literal_column("filesystem_items.content_tsv")
+_content_tsv_present = {}
+
+
+def has_content_tsv():
+    """Whether this database has content_tsv, checked once per engine."""
+    url = str(db.engine.url)
+    if url not in _content_tsv_present:
+        columns = inspect(db.engine).get_columns(FileSystemItem.__tablename__)
+        _content_tsv_present[url] = any(column["name"] == "content_tsv" for column in columns)
+    return _content_tsv_present[url]
+
+
+def signed_download_url(file_path, item):
+    """A short lived GCS URL that downloads item as an attachment, or None.
+
+    None when the credentials cannot sign, so the download is streamed instead.
+    """
+    try:
+        return bucket.blob(file_path).generate_signed_url(
+            version="v4",
+            expiration=GCS_SIGNED_URL_TTL,
+            method="GET",
+            response_disposition=f"attachment; filename*=UTF-8''{quote(item.name)}",
+            response_type=item.mime_type,
         )
+    except Exception as e:
+        logger.warning("Could not sign a download URL for %s, streaming it instead: %s", file_path, str(e))
+        return None
+
+
+def get_file_path(item_id, filename=None):
+    name = f"{item_id}.{filename.rpartition('.')[2]}" if filename and "." in filename else str(item_id)
+    return f"uploads/{name}" if USE_GCS else os.path.join(UPLOAD_FOLDER, name)
+
+
+def delete_stored_file(file_path):
+    """Remove one stored file. One that is already gone is not an error."""
+    try:
+        if USE_GCS:
+            bucket.delete_blob(file_path)
+            logger.info("Deleted file from GCS: %s", file_path)
+        else:
+            os.remove(file_path)
+            logger.info("Deleted file from local storage: %s", file_path)
+    except FileNotFoundError:
+        logger.warning("File not found on disk during deletion: %s", file_path)
+    except Exception as e:
+        if NotFound is not None and isinstance(e, NotFound):
+            logger.warning("File not found in GCS during deletion: %s", file_path)
+        else:
+            # Continue with database deletion - orphaned file will be logged
+            logger.error("Error deleting file %s: %s", file_path, str(e))
+
+
+def delete_blobs_batched(names):
+    """Delete GCS objects GCS_DELETE_BATCH_SIZE at a time, one HTTP request per batch.
+
+    Failures inside a batch, objects already gone included, are not raised, so
+    one missing object does not stop the rest of the batch. Returns the names
+    whose batch request failed as a whole.
+    """
+    failed = []
+    for start in range(0, len(names), GCS_DELETE_BATCH_SIZE):
+        end = start + GCS_DELETE_BATCH_SIZE
+        chunk = names[start:end]
+        try:
+            with storage_client.batch(raise_exception=False):
+                bucket.delete_blobs(chunk)
+            logger.info("Deleted %d files from GCS in one batch", len(chunk))
+        except Exception as e:
+            logger.warning("Batch delete of %d GCS files failed, retrying one by one: %s", len(chunk), str(e))
+            failed.extend(chunk)
+    return failed
+
+
+def delete_stored_files(file_paths):
+    """Remove stored files, so a folder costs a few round trips, not one per file.
+
+    GCS deletes go out as batch requests. Local files, and any GCS batch that
+    failed outright, are removed one by one on a thread pool.
+    """
+    if USE_GCS and len(file_paths) > 1:
+        file_paths = delete_blobs_batched(file_paths)
+    if len(file_paths) <= 1:
+        for file_path in file_paths:
+            delete_stored_file(file_path)
+        return
+    with ThreadPoolExecutor(max_workers=min(DELETE_WORKERS, len(file_paths))) as pool:
+        list(pool.map(delete_stored_file, file_paths))
+
+
+def copy_stream(source, target, size):
+    """Copy size bytes from source into the file target.
+
+    Werkzeug spools any upload over 500 KB to a temporary file. On Linux that
+    file is copied with sendfile, inside the kernel, instead of being read into
+    Python a chunk at a time and written back out. Smaller uploads arrive as
+    BytesIO, with no descriptor, and take the ordinary copy.
+    """
+    try:
+        source_fd = source.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        source_fd = None
+
+    if source_fd is None or not sys.platform.startswith("linux"):
+        shutil.copyfileobj(source, target, UPLOAD_CHUNK_SIZE)
+        return
+
+    offset = source.tell()
+    target.flush()
+    target_fd = target.fileno()
+    while offset < size:
+        sent = os.sendfile(target_fd, source_fd, offset, min(size - offset, UPLOAD_CHUNK_SIZE * 64))
+        if sent == 0:
+            break
+        offset += sent
+
+
+def copy_stored_file(source_path, file_path):
+    """Duplicate a stored file without sending its bytes. Returns whether it worked."""
+    try:
+        if USE_GCS:
+            bucket.copy_blob(bucket.blob(source_path), bucket, file_path)
+        else:
+            os.link(source_path, file_path)
+    except Exception as e:
+        logger.warning("Could not copy %s to %s, uploading instead: %s", source_path, file_path, str(e))
+        return False
+    logger.info("Stored duplicate upload %s as a copy of %s", file_path, source_path)
+    return True
+
+
+def store_upload(file_path, stream, size, content_type, copy_from=None):
+    """Write an upload to GCS or local storage.
+
+    copy_from names a stored file known to hold the same bytes. It is copied in
+    place of sending the upload again: server side within GCS, or as a hard
+    link on disk. Either way each item still owns its own object, so deleting
+    one never breaks another. If the copy fails the upload is written normally.
+    """
+    if copy_from and copy_stored_file(copy_from, file_path):
+        return
+
+    if USE_GCS:
+        # Past one chunk this is a resumable upload, sent and retried a chunk at
+        # a time. The SDK only retries when a retry cannot overwrite anything,
+        # which if_generation_match=0 states: the object must not exist yet, as
+        # it never does under a new item's id.
+        blob = bucket.blob(file_path, chunk_size=GCS_UPLOAD_CHUNK_SIZE)
+        blob.upload_from_file(stream, content_type=content_type, size=size, rewind=True, if_generation_match=0)
+        logger.info("Uploaded file to GCS: %s", file_path)
     else:
-        base_path = f"uploads/{item_id}" if USE_GCS else os.path.join(UPLOAD_FOLDER, str(item_id))
-    return base_path
+        # Create directory if needed
+        dir_path = os.path.dirname(file_path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+
+        stream.seek(0)
+        with open(file_path, "wb") as f:
+            copy_stream(stream, f, size)
+        logger.info("Uploaded file to local storage: %s", file_path)
 
 
 @operations_bp.route("/filesystem/<int:item_id>", methods=["PUT"])
@@ -116,7 +432,7 @@ def get_file_path(item_id, filename=None):
 def update_filesystem_item(item_id):
     try:
         user = get_or_create_user(db, User)
-        item = FileSystemItem.query.filter_by(id=item_id, owner_id=user.id).first()
+        item = get_owned_item(item_id, user.id)
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
@@ -141,26 +457,15 @@ def update_filesystem_item(item_id):
                 if "." in new_name and new_name.rsplit(".", 1)[1]:
                     return jsonify({"error": "Folders cannot have file extensions"}), 400
 
-            # Check for existing item with same name
-            existing_item = FileSystemItem.query.filter(
-                FileSystemItem.name == new_name,
-                FileSystemItem.parent_id == item.parent_id,
-                FileSystemItem.owner_id == user.id,
-                FileSystemItem.id != item_id,
-            ).first()
-
-            if existing_item:
-                return (
-                    jsonify({"error": "An item with this name already exists in this folder"}),
-                    400,
-                )
-
             item.name = new_name
 
         if "parent_id" in data:
             item.parent_id = data["parent_id"]
 
-        db.session.commit()
+        # A request that changes nothing writes nothing. is_modified compares
+        # against the loaded values, so a name sent back unchanged counts too.
+        if db.session.is_modified(item):
+            db.session.commit()
 
         logger.info("Updated filesystem item: %s", item.name)
         return jsonify(item.to_dict()), 200
@@ -168,7 +473,7 @@ def update_filesystem_item(item_id):
     except IntegrityError as e:
         db.session.rollback()
         logger.error("Integrity error updating filesystem item %s: %s", item_id, str(e))
-        if "unique_name_per_location_per_owner" in str(e):
+        if is_name_conflict(e):
             return (
                 jsonify({"error": "An item with this name already exists in this folder"}),
                 409,
@@ -185,72 +490,28 @@ def update_filesystem_item(item_id):
 def delete_filesystem_item(item_id):
     try:
         user = get_or_create_user(db, User)
-        item = FileSystemItem.query.filter_by(id=item_id, owner_id=user.id).first()
+        item = get_owned_item(item_id, user.id)
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
 
         item_name = item.name  # Store name before deletion
 
-        if item.type == "file":
-            file_path = get_file_path(item_id, item.name)
-            if USE_GCS:
-                try:
-                    blob = bucket.blob(file_path)
-                    if blob.exists():
-                        blob.delete()
-                        logger.info("Deleted file from GCS: %s", file_path)
-                    else:
-                        logger.warning("File not found in GCS during deletion: %s", file_path)
-                except Exception as e:
-                    logger.error("Error deleting file from GCS %s: %s", file_path, str(e))
-                    # Continue with database deletion - orphaned file will be logged
-            else:
-                if os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        logger.info("Deleted file from local storage: %s", file_path)
-                    except Exception as e:
-                        logger.error("Error deleting file from local storage %s: %s", file_path, str(e))
-                        # Continue with database deletion - orphaned file will be logged
-                else:
-                    logger.warning("File not found on disk during deletion: %s", file_path)
-
-        if item.type == "folder":
-
-            def delete_children(parent_id):
-                children = FileSystemItem.query.filter_by(parent_id=parent_id).all()
-                for child in children:
-                    if child.type == "file":
-                        child_file_path = get_file_path(child.id, child.name)
-                        if USE_GCS:
-                            try:
-                                blob = bucket.blob(child_file_path)
-                                if blob.exists():
-                                    blob.delete()
-                                    logger.info("Deleted child file from GCS: %s", child_file_path)
-                                else:
-                                    logger.warning("Child file not found in GCS during deletion: %s", child_file_path)
-                            except Exception as e:
-                                logger.error("Error deleting child file from GCS %s: %s", child_file_path, str(e))
-                        else:
-                            if os.path.exists(child_file_path):
-                                try:
-                                    os.remove(child_file_path)
-                                    logger.info("Deleted child file from local storage: %s", child_file_path)
-                                except Exception as e:
-                                    logger.error(
-                                        "Error deleting child file from local storage %s: %s", child_file_path, str(e)
-                                    )
-                            else:
-                                logger.warning("Child file not found on disk during deletion: %s", child_file_path)
-                    elif child.type == "folder":
-                        delete_children(child.id)
-                    db.session.delete(child)
-
-            delete_children(item.id)
-
-        db.session.delete(item)
+        # The subtree stays a subquery in every statement below, never a list of
+        # ids in Python, so a folder of any size is deleted with the same few
+        # statements and no parameter per row.
+        subtree_ids = db.select(descendants_cte(item.id, user.id).c.id)
+        files = (
+            db.session.query(FileSystemItem.id, FileSystemItem.name)
+            .filter(FileSystemItem.id.in_(subtree_ids), FileSystemItem.type == "file")
+            .all()
+        )
+
+        delete_stored_files([get_file_path(file_id, file_name) for file_id, file_name in files])
+
+        # Bulk deletes bypass the ORM cascade, so the permissions go first.
+        FilePermission.query.filter(FilePermission.item_id.in_(subtree_ids)).delete(synchronize_session=False)
+        FileSystemItem.query.filter(FileSystemItem.id.in_(subtree_ids)).delete(synchronize_session=False)
         db.session.commit()
 
         logger.info("Deleted filesystem item: %s (ID: %s)", item_name, item_id)
@@ -268,10 +529,21 @@ def upload_file():
     try:
         user = get_or_create_user(db, User)
 
-        if "file" not in request.files:
+        if request.content_length and request.content_length > MAX_UPLOAD_REQUEST_SIZE:
+            max_mb = MAX_FILE_SIZE / (1024 * 1024)
+            return jsonify({"error": f"Upload too large (max {max_mb}MB)"}), 400
+
+        try:
+            files = request.files
+        except RequestEntityTooLarge:
+            # A body with no Content-Length, cut off once it passed the limit.
+            max_mb = MAX_FILE_SIZE / (1024 * 1024)
+            return jsonify({"error": f"Upload too large (max {max_mb}MB)"}), 400
+
+        if "file" not in files:
             return jsonify({"error": "No file provided"}), 400
 
-        file = request.files["file"]
+        file = files["file"]
 
         if file.filename == "":
             return jsonify({"error": "No file selected"}), 400
@@ -290,39 +562,27 @@ def upload_file():
         if not is_valid:
             return jsonify({"error": f"Invalid filename: {error_msg}"}), 400
 
-        existing_item = FileSystemItem.query.filter_by(name=filename, parent_id=parent_id, owner_id=user.id).first()
+        # Worked on as a stream from here on. Werkzeug has already spooled the
+        # upload to a temporary file, and reading it into bytes would hold a
+        # second full copy in memory for the rest of the request.
+        file_stream = file.stream
+        file_size = stream_size(file_stream)
 
-        if existing_item:
-            return (
-                jsonify({"error": "A file with this name already exists in this folder"}),
-                400,
-            )
-
-        file_content = file.read()
-
-        size_valid, size_message = validate_file_size(file_content)
+        size_valid, size_message = validate_file_size(file_size)
         if not size_valid:
             return jsonify({"error": size_message}), 400
 
-        pdf_valid, pdf_message = validate_pdf_content(file_content)
+        header = file_stream.read(PDF_SNIFF_SIZE)
+        file_stream.seek(0)
+        pdf_valid, pdf_message = validate_pdf_fast(header)
+        if not pdf_valid:
+            return jsonify({"error": pdf_message}), 400
+        pdf_valid, pdf_message = validate_pdf_trailer(file_stream, file_size)
         if not pdf_valid:
             return jsonify({"error": pdf_message}), 400
 
-        # Enhanced PDF content validation - check for meaningful content
-        if HAS_PYPDF2 and file_content.startswith(b"%PDF-"):
-            try:
-                pdf_file = BytesIO(file_content)
-                reader = PdfReader(pdf_file)
-                text_content = ""
-                for page in reader.pages:
-                    text_content += page.extract_text() + "\n"
-
-                if not has_meaningful_content(text_content):
-                    return jsonify({"error": "PDF file appears to be empty or contain no meaningful content"}), 400
-            except Exception as e:
-                logger.warning("Could not extract text for content validation: %s", str(e))
-
-        file_size = len(file_content)
+        # Hashed while Werkzeug spooled it, when it came in through UploadRequest.
+        content_sha256 = getattr(file_stream, "sha256", None) or stream_sha256(file_stream)
 
         item = FileSystemItem(
             name=filename,
@@ -331,6 +591,7 @@ def upload_file():
             owner_id=user.id,
             size=file_size,
             mime_type="application/pdf",
+            content_sha256=content_sha256,
         )
 
         db.session.add(item)
@@ -338,48 +599,43 @@ def upload_file():
 
         file_path = get_file_path(item.id, filename)
 
-        if USE_GCS:
-            blob = bucket.blob(file_path)
-            blob.upload_from_string(file_content, content_type=item.mime_type)
-            logger.info("Uploaded file to GCS: %s", file_path)
-        else:
-            # Ensure directory exists and path is safe
-            if not is_safe_path(file_path):
-                db.session.rollback()
-                return jsonify({"error": "Invalid file path"}), 400
-
-            # Create directory if needed
-            dir_path = os.path.dirname(file_path)
-            if dir_path and not os.path.exists(dir_path):
-                os.makedirs(dir_path)
+        if not USE_GCS and not is_safe_path(file_path):
+            db.session.rollback()
+            return jsonify({"error": "Invalid file path"}), 400
 
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-            logger.info("Uploaded file to local storage: %s", file_path)
+        # The bytes are written while the row commits, rather than with the
+        # transaction held open for the whole transfer. The request still waits
+        # for both, so a 201 keeps meaning the file is stored.
+        duplicate = (
+            db.session.query(FileSystemItem.id, FileSystemItem.name)
+            .filter(
+                FileSystemItem.owner_id == user.id,
+                FileSystemItem.content_sha256 == content_sha256,
+                FileSystemItem.id != item.id,
+                FileSystemItem.path.isnot(None),
+            )
+            .first()
+        )
+        copy_from = get_file_path(duplicate.id, duplicate.name) if duplicate else None
 
+        stored = STORAGE_POOL.submit(store_upload, file_path, file_stream, file_size, item.mime_type, copy_from)
         item.path = file_path
-        db.session.commit()
+        try:
+            db.session.commit()
+        except Exception:
+            # No row to point at the file, so it would only be an orphan.
+            if stored.exception() is None:
+                delete_stored_file(file_path)
+            raise
 
         try:
-            import requests
+            stored.result()
+        except Exception:
+            db.session.delete(item)
+            db.session.commit()
+            raise
 
-            logger.info("Attempting to notify text extractor for file %s", item.id)
-            extraction_response = requests.post(
-                f"{TEXT_EXTRACTOR_URL}/extract",
-                json={"file_id": item.id, "file_path": file_path},
-                timeout=5,
-            )
-            logger.info("Extractor response status: %s", extraction_response.status_code)
-            logger.info("Extractor response body: %s", extraction_response.text)
-
-            if extraction_response.status_code == 200:
-                logger.info("File %s queued for text extraction", item.id)
-            else:
-                logger.warning("Failed to queue file %s for extraction: %s", item.id, extraction_response.status_code)
-        except requests.exceptions.RequestException as e:
-            logger.error("Network error contacting text extractor: %s", str(e))
-        except Exception as e:
-            logger.error("Unexpected error notifying text extractor: %s", str(e))
+        NOTIFY_POOL.submit(notify_extractor, item.id, file_path)
 
         logger.info("Uploaded file: %s", item.name)
         return jsonify(item.to_dict()), 201
@@ -387,7 +643,7 @@ def upload_file():
     except IntegrityError as e:
         db.session.rollback()
         logger.error("Integrity error uploading file: %s", str(e))
-        if "unique_name_per_location_per_owner" in str(e):
+        if is_name_conflict(e):
             return (
                 jsonify({"error": "A file with this name already exists in this folder"}),
                 409,
@@ -404,7 +660,7 @@ def upload_file():
 def download_file(item_id):
     try:
         user = get_or_create_user(db, User)
-        item = FileSystemItem.query.filter_by(id=item_id, owner_id=user.id).first()
+        item = get_owned_item(item_id, user.id)
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
@@ -414,24 +670,52 @@ def download_file(item_id):
 
         file_path = get_file_path(item_id, item.name)
 
-        if USE_GCS:
-            blob = bucket.blob(file_path)
-            if not blob.exists():
-                return jsonify({"error": "File not found in GCS"}), 404
+        if USE_GCS and GCS_SIGNED_URL_MIN_SIZE and (item.size or 0) >= GCS_SIGNED_URL_MIN_SIZE:
+            url = signed_download_url(file_path, item)
+            if url:
+                return redirect(url)
 
-            file_data = blob.download_as_bytes()
-            return send_file(
-                BytesIO(file_data),
+        if USE_GCS:
+            # Streamed through in chunks as the client reads, rather than the
+            # whole object downloaded into memory before the first byte is sent.
+            stream = io.BufferedReader(GCSObjectReader(bucket.blob(file_path), item.size), GCS_DOWNLOAD_CHUNK_SIZE)
+            response = send_file(
+                stream,
                 as_attachment=True,
                 download_name=item.name,
                 mimetype=item.mime_type,
+                etag=item.content_sha256 or False,
+                last_modified=item.updated_at,
+                conditional=False,
             )
+            # send_file cannot size a stream, so it is made conditional here,
+            # with the stored size, to answer If-None-Match and Range.
+            response.content_length = item.size
+            try:
+                response = response.make_conditional(request.environ, accept_ranges=True, complete_length=item.size)
+            except HTTPException as e:
+                stream.close()
+                return e
+
+            if response.status_code != 304:
+                # Fetching the first chunk now is how a missing object is found
+                # while a 404 can still be sent, without an exists() round trip.
+                try:
+                    stream.peek(1)
+                except NotFound:
+                    stream.close()
+                    return jsonify({"error": "File not found in GCS"}), 404
+            return response
         else:
-            if not os.path.exists(file_path):
+            try:
+                # The content hash, like the GCS path, rather than werkzeug's tag of
+                # path, size and mtime, so the tag survives a file being restored.
+                return send_file(
+                    file_path, as_attachment=True, download_name=item.name, etag=item.content_sha256 or True
+                )
+            except FileNotFoundError:
                 return jsonify({"error": "File not found on disk"}), 404
 
-            return send_file(file_path, as_attachment=True, download_name=item.name)
-
     except Exception as e:
         logger.error("Error downloading file %s: %s", item_id, str(e))
         return jsonify({"error": "Internal server error"}), 500
@@ -448,6 +732,8 @@ def search_files():
         parent_id = request.args.get("parent_id", type=int)
         page = request.args.get("page", 1, type=int)
         limit = request.args.get("limit", 50, type=int)
+        after_name = request.args.get("after_name", "")
+        after_id = request.args.get("after_id", type=int)
 
         if not query:
             return jsonify({"error": "Search query is required"}), 400
@@ -464,48 +750,64 @@ def search_files():
 
         search_conditions = [FileSystemItem.name.ilike(f"%{query}%")]
 
-        search_conditions.append(FileSystemItem.content_text.ilike(f"%{query}%"))
+        # Where the precomputed vector exists, content is matched with one GIN
+        # index probe. The ILIKE fallback scans the full text of every row.
+        if has_content_tsv():
+            search_conditions.append(CONTENT_TSV.op("@@")(func.plainto_tsquery("english", query)))
+        else:
+            search_conditions.append(FileSystemItem.content_text.ilike(f"%{query}%"))
 
         base_query = base_query.filter(or_(*search_conditions))
 
         if file_type in ["file", "folder"]:
             base_query = base_query.filter(FileSystemItem.type == file_type)
 
-        def get_folder_ids_recursive(folder_id):
-            folder_ids = [folder_id]
-            subfolders = FileSystemItem.query.filter_by(parent_id=folder_id, type="folder", owner_id=user.id).all()
-
-            for subfolder in subfolders:
-                folder_ids.extend(get_folder_ids_recursive(subfolder.id))
-
-            return folder_ids
-
         if parent_id is not None:
-            parent_folder = FileSystemItem.query.filter_by(id=parent_id, owner_id=user.id, type="folder").first()
-            if not parent_folder:
+            if not FileSystemItem.exists(id=parent_id, owner_id=user.id, type="folder"):
                 return jsonify({"error": "Parent folder not found"}), 404
 
-            searchable_folder_ids = get_folder_ids_recursive(parent_id)
-            base_query = base_query.filter(FileSystemItem.parent_id.in_(searchable_folder_ids))
+            folders = descendants_cte(parent_id, user.id, folders_only=True)
+            base_query = base_query.filter(FileSystemItem.parent_id.in_(db.select(folders.c.id)))
+
+        # Pages are fetched with_entities(row_columns()): plain rows of just the
+        # serialized columns, with no ORM objects to build for them.
+        base_query = base_query.order_by(FileSystemItem.name.asc(), FileSystemItem.id.asc())
+
+        if "after_id" in request.args:
+            # Keyset page: seek past the last row the caller saw, using the
+            # sort order itself, so page ten costs what page one does. There is
+            # no count, and no page number, in this mode. An empty after_id
+            # asks for the first page of it.
+            if after_id is not None:
+                base_query = base_query.filter(
+                    tuple_(FileSystemItem.name, FileSystemItem.id) > tuple_(literal(after_name), literal(after_id))
+                )
+            rows = base_query.with_entities(*FileSystemItem.row_columns()).limit(limit + 1).all()
+            items = rows[:limit]
+            has_next = len(rows) > limit
+            has_prev = after_id is not None
+            total_count = total_pages = None
+            total_is_estimate = False
+            page = None
         else:
-            all_folders = FileSystemItem.query.filter_by(owner_id=user.id, type="folder").all()
-
-            searchable_folder_ids = [None]
-            for folder in all_folders:
-                searchable_folder_ids.append(folder.id)
-
-        base_query = base_query.order_by(FileSystemItem.name.asc())
+            offset = (page - 1) * limit
 
-        total_count = base_query.count()
+            # Deep pages are only reached by paging through a broad match, where
+            # an exact count costs as much as the search itself and a ballpark
+            # is as useful to the caller.
+            total_count = count_estimate(base_query) if offset >= EXACT_COUNT_MAX_OFFSET else None
+            total_is_estimate = total_count is not None
+            if total_count is None:
+                total_count = base_query.count()
+            items = base_query.with_entities(*FileSystemItem.row_columns()).offset(offset).limit(limit).all()
 
-        offset = (page - 1) * limit
-        items = base_query.offset(offset).limit(limit).all()
+            total_pages = (total_count + limit - 1) // limit
+            has_next = page < total_pages
+            has_prev = page > 1
 
-        total_pages = (total_count + limit - 1) // limit
-        has_next = page < total_pages
-        has_prev = page > 1
+        next_cursor = {"after_name": items[-1].name, "after_id": str(items[-1].id)} if has_next and items else None
 
-        results = [item.to_dict() for item in items]
+        results = FileSystemItem.to_rows(items)
 
         logger.info(
             "Search completed: query='%s', type='%s', parent_id=%s, found %d items",
@@ -515,26 +817,25 @@ def search_files():
             len(results),
         )
 
-        return (
-            jsonify(
-                {
-                    "results": results,
-                    "pagination": {
-                        "current_page": page,
-                        "total_pages": total_pages,
-                        "total_items": total_count,
-                        "items_per_page": limit,
-                        "has_next": has_next,
-                        "has_prev": has_prev,
-                    },
-                    "query": query,
-                    "filters": {
-                        "type": file_type if file_type else None,
-                        "parent_id": parent_id,
-                    },
-                }
-            ),
-            200,
+        return json_response(
+            {
+                "results": results,
+                "pagination": {
+                    "current_page": page,
+                    "total_pages": total_pages,
+                    "total_items": total_count,
+                    "total_is_estimate": total_is_estimate,
+                    "items_per_page": limit,
+                    "has_next": has_next,
+                    "has_prev": has_prev,
+                    "next_cursor": next_cursor,
+                },
+                "query": query,
+                "filters": {
+                    "type": file_type if file_type else None,
+                    "parent_id": parent_id,
+                },
+            }
         )
 
     except Exception as e:
@@ -547,7 +848,7 @@ def search_files():
 def trigger_text_extraction(item_id):
     try:
         user = get_or_create_user(db, User)
-        item = FileSystemItem.query.filter_by(id=item_id, owner_id=user.id).first()
+        item = get_owned_item(item_id, user.id)
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
@@ -561,7 +862,7 @@ def trigger_text_extraction(item_id):
         db.session.commit()
 
         try:
-            extraction_response = requests.post(
+            extraction_response = EXTRACTOR_SESSION.post(
                 f"{TEXT_EXTRACTOR_URL}/extract", json={"file_id": item.id, "file_path": item.path}, timeout=1
             )
             if extraction_response.status_code == 200:
@@ -3,8 +3,9 @@ import logging
 from auth import get_or_create_user, requires_auth
 from database import db
 from flask import Blueprint, jsonify, request
-from models import FileSystemItem, User
+from models import FileSystemItem, User, get_owned_item
 from pagination import paginate, pagination_args
+from serialization import json_response
 from sqlalchemy import text
 
 logger = logging.getLogger(__name__)
@@ -22,10 +23,22 @@ def get_filesystem_items():
         limit, offset = pagination_args()
 
         if parent_id is None:
-            page = paginate(FileSystemItem.query.filter_by(parent_id=None, owner_id=user.id), limit, offset)
-            return jsonify({**page, "breadcrumb": []}), 200
+            page = paginate(
+                FileSystemItem.query.filter_by(parent_id=None, owner_id=user.id),
+                limit,
+                offset,
+                serialize=FileSystemItem.to_rows,
+                columns=FileSystemItem.row_columns(),
+            )
+            return json_response({**page, "breadcrumb": []})
         else:
-            page = paginate(FileSystemItem.query.filter_by(parent_id=parent_id, owner_id=user.id), limit, offset)
+            page = paginate(
+                FileSystemItem.query.filter_by(parent_id=parent_id, owner_id=user.id),
+                limit,
+                offset,
+                serialize=FileSystemItem.to_rows,
+                columns=FileSystemItem.row_columns(),
+            )
 
             # Get breadcrumb using single recursive CTE query
             query = text(
@@ -51,29 +64,14 @@ def get_filesystem_items():
                 FROM breadcrumb_path
                 ORDER BY depth DESC
             """
-            )
+            ).columns(created_at=db.DateTime, updated_at=db.DateTime)
 
+            # The datetimes go to the encoder as they are, which writes the same
+            # ISO 8601 text isoformat() would.
             result = db.session.execute(query, {"item_id": parent_id, "owner_id": user.id})
-            rows = result.fetchall()
-
-            breadcrumb = []
-            for row in rows:
-                breadcrumb.append(
-                    {
-                        "id": row[0],
-                        "name": row[1],
-                        "type": row[2],
-                        "parent_id": row[3],
-                        "created_at": row[4].isoformat() if row[4] else None,
-                        "updated_at": row[5].isoformat() if row[5] else None,
-                        "owner_id": row[6],
-                        "size": row[7],
-                        "mime_type": row[8],
-                        "path": row[9],
-                    }
-                )
+            breadcrumb = [dict(row) for row in result.mappings()]
 
-            return jsonify({**page, "breadcrumb": breadcrumb}), 200
+            return json_response({**page, "breadcrumb": breadcrumb})
 
     except Exception as e:
         logger.error("[ERROR] Error fetching filesystem items: %s", str(e))
@@ -85,7 +83,7 @@ def get_filesystem_items():
 def get_filesystem_item(item_id):
     try:
         user = get_or_create_user(db, User)
-        item = FileSystemItem.query.filter_by(id=item_id, owner_id=user.id).first()
+        item = get_owned_item(item_id, user.id)
 
         if not item:
             return jsonify({"error": "Item not found"}), 404
@@ -3,7 +3,7 @@ import logging
 from auth import get_or_create_user, requires_auth
 from database import db
 from flask import Blueprint, jsonify, request
-from models import FileSystemItem, User
+from models import FileSystemItem, User, is_name_conflict
 from sqlalchemy.exc import IntegrityError
 from utils import sanitize_filename, validate_filename
 
@@ -37,16 +37,6 @@ def create_filesystem_item():
             if "." in sanitized_name and sanitized_name.rsplit(".", 1)[1]:
                 return jsonify({"error": "Folders cannot have file extensions"}), 400
 
-        existing_item = FileSystemItem.query.filter_by(
-            name=sanitized_name, parent_id=data.get("parent_id"), owner_id=user.id
-        ).first()
-
-        if existing_item:
-            return (
-                jsonify({"error": "An item with this name already exists in this folder"}),
-                400,
-            )
-
         item = FileSystemItem(
             name=sanitized_name,
             type=data["type"],
@@ -66,7 +56,7 @@ def create_filesystem_item():
     except IntegrityError as e:
         db.session.rollback()
         logger.error("[ERROR] Integrity error creating filesystem item: %s", str(e))
-        if "unique_name_per_location_per_owner" in str(e):
+        if is_name_conflict(e):
             return (
                 jsonify({"error": "An item with this name already exists in this folder"}),
                 409,
@@ -4,13 +4,66 @@ Usage:
   python run_bjoern.py read
   python run_bjoern.py write
   python run_bjoern.py operations
+
+WORKERS=N forks N bjoern processes for the one app. bjoern runs a single
+thread, so one process uses one core however many the host has. Over TCP each
+worker binds its own socket to the port with SO_REUSEPORT and the kernel
+spreads connections across them. A unix socket path cannot be bound twice, so
+there the socket is bound once and the workers share it.
 """
 
+import os
+import signal
 import sys
 from os import getenv
 
 import bjoern
 from app_factory import APP_CONFIGS, create_app
+from database import db
+
+
+def _after_fork(app):
+    # Connections opened before the fork, by the startup check for one, belong
+    # to the parent. Sharing them would interleave two processes' queries on one
+    # socket, so the child drops its copies without closing them.
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _serve_workers(app, workers, listen):
+    """Run workers copies of bjoern, as child processes of this one.
+
+    listen binds the socket in each child before it serves. If any worker exits
+    the rest are stopped and this process exits with an error, so supervisord
+    restarts the app as a whole.
+    """
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            _after_fork(app)
+            listen()
+            bjoern.run()
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    pid, status = os.wait()
+    print(f"Worker {pid} exited with status {status}, stopping the others")
+    children.remove(pid)
+    for child in children:
+        os.kill(child, signal.SIGTERM)
+    sys.exit(1)
 
 
 def run_app(app_type):
@@ -24,13 +77,24 @@ def run_app(app_type):
 
     SOCKET = getenv("SOCKET")
     PORT = int(getenv("PORT", config["default_port"]))
+    WORKERS = max(1, int(getenv("WORKERS", "1")))
+
+    if WORKERS == 1:
+        if SOCKET:
+            print(f"[{config['name']}] Serving from socket {SOCKET}")
+            bjoern.run(app, f"unix:{SOCKET}")
+        else:
+            print(f"[{config['name']}] Serving from TCP port {PORT}")
+            bjoern.run(app, "0.0.0.0", PORT)
+        return
 
     if SOCKET:
-        print(f"[{config['name']}] Serving from socket {SOCKET}")
-        bjoern.run(app, f"unix:{SOCKET}")
+        print(f"[{config['name']}] Serving from socket {SOCKET} with {WORKERS} workers")
+        bjoern.listen(app, f"unix:{SOCKET}")
+        _serve_workers(app, WORKERS, listen=lambda: None)
     else:
-        print(f"[{config['name']}] Serving from TCP port {PORT}")
-        bjoern.run(app, "0.0.0.0", PORT)
+        print(f"[{config['name']}] Serving from TCP port {PORT} with {WORKERS} workers")
+        _serve_workers(app, WORKERS, listen=lambda: bjoern.listen(app, "0.0.0.0", PORT, reuse_port=True))
 
 
 if __name__ == "__main__":
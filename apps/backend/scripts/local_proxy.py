@@ -3,14 +3,21 @@ Local development reverse proxy
 Routes requests to appropriate backend app based on HTTP method and path
 """
 
+import functools
 import logging
+import os
+import sys
 
 import requests
 from flask import Flask, Response, request
-from flask_cors import CORS
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cors import init_cors  # noqa: E402
 
 app = Flask(__name__)
-CORS(app)
+init_cors(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,34 @@ READ_SERVICE = "http://localhost:6001"
 WRITE_SERVICE = "http://localhost:6002"
 OPERATIONS_SERVICE = "http://localhost:6003"
 
+# Reused across requests so connections to the three backends are kept alive
+# instead of opened per proxied call.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=3, pool_maxsize=100))
+
+CHUNK_SIZE = 64 * 1024
+# Connect, read. Without these a hung backend pins a proxy thread indefinitely.
+TIMEOUT = (3, 30)
+
+
+class _SizedStream:
+    """The request body as a file object requests can send with a Content-Length.
+
+    Handed the bare input stream, requests cannot tell its length and switches to
+    chunked encoding, which then contradicts the Content-Length header forwarded
+    from the client.
+    """
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._length = length
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def __len__(self):
+        return self._length
+
 
 def proxy_request(target_url):
     """Forward request to target service"""
@@ -26,23 +61,27 @@ def proxy_request(target_url):
 
     headers = {key: value for key, value in request.headers if key.lower() != "host"}
 
+    # The body is streamed to the backend rather than read into memory first,
+    # which for an upload is the whole file.
+    if request.content_length:
+        body = _SizedStream(request.stream, request.content_length)
+    elif "chunked" in request.headers.get("Transfer-Encoding", "").lower():
+        # No length to forward, so relayed chunked, the way it arrived
+        body = iter(functools.partial(request.stream.read, CHUNK_SIZE), b"")
+    else:
+        body = request.get_data() or None
+
     try:
-        if request.method == "GET":
-            resp = requests.get(url, params=request.args, headers=headers, stream=True)
-        elif request.method == "POST":
-            resp = requests.post(
-                url,
-                data=request.get_data(),
-                headers=headers,
-                params=request.args,
-                stream=True,
-            )
-        elif request.method == "PUT":
-            resp = requests.put(url, data=request.get_data(), headers=headers, params=request.args)
-        elif request.method == "DELETE":
-            resp = requests.delete(url, headers=headers, params=request.args)
-        else:
-            return Response("Method not allowed", status=405)
+        resp = _SESSION.request(
+            request.method,
+            url,
+            params=request.args,
+            data=body,
+            headers=headers,
+            stream=True,
+            timeout=TIMEOUT,
+            allow_redirects=False,
+        )
 
         excluded_headers = [
             "content-encoding",
@@ -52,7 +91,11 @@ def proxy_request(target_url):
         ]
         headers = [(name, value) for name, value in resp.raw.headers.items() if name.lower() not in excluded_headers]
 
-        return Response(resp.content, resp.status_code, headers)
+        # Passed through chunk by chunk. resp.content would hold the whole body,
+        # a full file on downloads, in memory before sending the first byte.
+        response = Response(resp.iter_content(chunk_size=CHUNK_SIZE), resp.status_code, headers)
+        response.call_on_close(resp.close)
+        return response
 
     except requests.exceptions.ConnectionError:
         logger.error("Connection failed to %s", target_url)
@@ -62,64 +105,36 @@ def proxy_request(target_url):
         return Response(f"Proxy error: {str(e)}", status=500)
 
 
-@app.route("/api/health", methods=["GET"])
-def health():
-    """Health check - route to operations"""
-    logger.info("[PROXY] Health check -> OPERATIONS")
-    return proxy_request(OPERATIONS_SERVICE)
-
-
-@app.route("/api/filesystem", methods=["GET", "POST"])
-def filesystem_base():
-    """Route GET to read, POST to write"""
-    if request.method == "GET":
-        logger.info("[PROXY] GET /api/filesystem -> READ")
-        return proxy_request(READ_SERVICE)
-    elif request.method == "POST":
-        logger.info("[PROXY] POST /api/filesystem -> WRITE")
-        return proxy_request(WRITE_SERVICE)
-
-
-@app.route("/api/filesystem/<int:item_id>", methods=["GET", "PUT", "DELETE"])
-def filesystem_item(item_id):
-    """Route by method"""
-    if request.method == "GET":
-        logger.info("[PROXY] GET /api/filesystem/%s -> READ", item_id)
-        return proxy_request(READ_SERVICE)
-    elif request.method == "PUT":
-        logger.info("[PROXY] PUT /api/filesystem/%s -> OPERATIONS", item_id)
-        return proxy_request(OPERATIONS_SERVICE)
-    elif request.method == "DELETE":
-        logger.info("[PROXY] DELETE /api/filesystem/%s -> OPERATIONS", item_id)
-        return proxy_request(OPERATIONS_SERVICE)
-
-
-@app.route("/api/filesystem/upload", methods=["POST"])
-def upload():
-    """Upload to operations"""
-    logger.info("[PROXY] POST /api/filesystem/upload -> OPERATIONS")
-    return proxy_request(OPERATIONS_SERVICE)
-
-
-@app.route("/api/filesystem/<int:item_id>/download", methods=["GET"])
-def download(item_id):
-    """Download from operations"""
-    logger.info("[PROXY] GET /api/filesystem/%s/download -> OPERATIONS", item_id)
-    return proxy_request(OPERATIONS_SERVICE)
+# Which backend serves each (method, rule). Built once at import; every proxied
+# route is registered against the same view, which is a dict lookup.
+ROUTES = {
+    ("GET", "/api/health"): OPERATIONS_SERVICE,
+    ("GET", "/api/filesystem"): READ_SERVICE,
+    ("POST", "/api/filesystem"): WRITE_SERVICE,
+    ("GET", "/api/filesystem/<int:item_id>"): READ_SERVICE,
+    ("PUT", "/api/filesystem/<int:item_id>"): OPERATIONS_SERVICE,
+    ("DELETE", "/api/filesystem/<int:item_id>"): OPERATIONS_SERVICE,
+    ("POST", "/api/filesystem/upload"): OPERATIONS_SERVICE,
+    ("GET", "/api/filesystem/<int:item_id>/download"): OPERATIONS_SERVICE,
+    ("GET", "/api/filesystem/search"): OPERATIONS_SERVICE,
+    ("POST", "/api/test/<path:subpath>"): OPERATIONS_SERVICE,
+}
 
 
-@app.route("/api/filesystem/search", methods=["GET"])
-def search():
-    """Search files - route to operations"""
-    logger.info("[PROXY] GET /api/filesystem/search -> OPERATIONS")
-    return proxy_request(OPERATIONS_SERVICE)
+def route(**_):
+    """Forward to whichever backend ROUTES assigns this method and rule"""
+    # Flask answers HEAD on every GET rule, so it goes where the GET would.
+    method = "GET" if request.method == "HEAD" else request.method
+    target = ROUTES[(method, request.url_rule.rule)]
+    logger.debug("[PROXY] %s %s -> %s", request.method, request.path, target)
+    return proxy_request(target)
 
 
-@app.route("/api/test/<path:subpath>", methods=["POST"])
-def test_endpoints(subpath):
-    """Test endpoints to operations"""
-    logger.info("[PROXY] POST /api/test/%s -> OPERATIONS", subpath)
-    return proxy_request(OPERATIONS_SERVICE)
+_methods_by_rule = {}
+for _method, _rule in ROUTES:
+    _methods_by_rule.setdefault(_rule, []).append(_method)
+for _rule, _methods in _methods_by_rule.items():
+    app.add_url_rule(_rule, endpoint=_rule, view_func=route, methods=_methods)
 
 
 if __name__ == "__main__":
@@ -130,4 +145,4 @@ if __name__ == "__main__":
     print(f"OPERATIONS: {OPERATIONS_SERVICE}")
     print("Proxy:      http://localhost:5000")
     print("-" * 40)
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, threaded=True, use_reloader=False)
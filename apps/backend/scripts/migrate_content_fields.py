@@ -27,7 +27,8 @@ def upgrade_database():
                 ALTER TABLE filesystem_items
                 ADD COLUMN IF NOT EXISTS content_text TEXT,
                 ADD COLUMN IF NOT EXISTS content_extracted BOOLEAN DEFAULT FALSE,
-                ADD COLUMN IF NOT EXISTS extraction_error VARCHAR(500)
+                ADD COLUMN IF NOT EXISTS extraction_error VARCHAR(500),
+                ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64)
             """
                 )
             )
@@ -41,35 +42,104 @@ def upgrade_database():
         return False
 
 
-def create_search_index():
-    """Create search index for content text (PostgreSQL specific)"""
+# Dialects with GIN indexes, to_tsvector and CREATE INDEX CONCURRENTLY.
+POSTGRES_DIALECTS = {"postgresql", "cockroachdb"}
+
+
+def add_search_vector():
+    """Add content_tsv, the precomputed full-text vector search matches against
+
+    A generated column, so Postgres keeps it current on every write. Searching
+    an expression index instead only works while every query repeats the exact
+    to_tsvector expression, and pays for computing it on the query side too.
+    The name is weighted above the content for ranking.
+    """
+    if db.engine.dialect.name not in POSTGRES_DIALECTS:
+        logger.info("Skipping content_tsv: not supported on %s", db.engine.dialect.name)
+        return True
+
     try:
-        logger.info("Creating search index for content text...")
+        logger.info("Adding content_tsv search vector...")
 
         with db.engine.connect() as conn:
-            # Create GIN index for full-text search (PostgreSQL)
             conn.execute(
                 db.text(
                     """
-                CREATE INDEX IF NOT EXISTS idx_filesystem_content_search
-                ON filesystem_items
-                USING GIN(to_tsvector('english', COALESCE(content_text, '')))
+                ALTER TABLE filesystem_items
+                ADD COLUMN IF NOT EXISTS content_tsv tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+                    setweight(to_tsvector('english', COALESCE(content_text, '')), 'B')
+                ) STORED
             """
                 )
             )
+            conn.commit()
 
-            # Create regular index for name search
-            conn.execute(
-                db.text(
-                    """
-                CREATE INDEX IF NOT EXISTS idx_filesystem_name_search
-                ON filesystem_items
-                USING GIN(to_tsvector('english', name))
-            """
-                )
+        create_indexes([("idx_filesystem_content_tsv", "filesystem_items", "USING GIN(content_tsv)")])
+
+        logger.info("Successfully added content_tsv")
+        return True
+
+    except Exception as e:
+        logger.error("Failed to add content_tsv: %s", str(e))
+        return False
+
+
+def create_indexes(indexes, unique=False):
+    """Create (name, table, definition) indexes that do not exist yet
+
+    On Postgres they are built CONCURRENTLY. A plain CREATE INDEX blocks every
+    write to the table until it finishes, which on a populated filesystem_items
+    is a stalled upload path for the whole build. CONCURRENTLY refuses to run
+    inside a transaction, hence autocommit.
+    """
+    concurrently = "CONCURRENTLY " if db.engine.dialect.name in POSTGRES_DIALECTS else ""
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, table, definition in indexes:
+            conn.execute(db.text(f"CREATE {kind} {concurrently}IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def drop_indexes(names):
+    """Drop indexes that exist, CONCURRENTLY on Postgres for the same reason"""
+    concurrently = "CONCURRENTLY " if db.engine.dialect.name in POSTGRES_DIALECTS else ""
+
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name in names:
+            conn.execute(db.text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+def create_search_index():
+    """Create search index for content text (PostgreSQL specific)"""
+    if db.engine.dialect.name not in POSTGRES_DIALECTS:
+        logger.info("Skipping search indexes: not supported on %s", db.engine.dialect.name)
+        return True
+
+    try:
+        logger.info("Creating search index for content text...")
+
+        with db.engine.connect() as conn:
+            # Trigram matching, so the name ILIKE '%q%' in search can use an index
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+                db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm")
             )
 
-            conn.commit()
+        create_indexes(
+            [
+                # GIN index for full-text search
+                (
+                    "idx_filesystem_content_search",
+                    "filesystem_items",
+                    "USING GIN(to_tsvector('english', COALESCE(content_text, '')))",
+                ),
+                ("idx_filesystem_name_search", "filesystem_items", "USING GIN(to_tsvector('english', name))"),
+                ("idx_filesystem_name_trgm", "filesystem_items", "USING GIN(name gin_trgm_ops)"),
+            ]
+        )
 
         logger.info("Successfully created search indexes")
         return True
@@ -79,14 +149,96 @@ def create_search_index():
         return False
 
 
-if __name__ == "__main__":
-    # Setup logging
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# As in Alembic revision c4e7a2d91b30: items at the root that share a name with
+# an older one get their id appended, "report.pdf (42)", so the unique index on
+# root names can be built over a database that predates it.
+RENAME_DUPLICATE_ROOT_NAMES = """
+    UPDATE filesystem_items
+    SET name = SUBSTR(name, 1, 252 - LENGTH(CAST(id AS TEXT))) || ' (' || CAST(id AS TEXT) || ')'
+    WHERE parent_id IS NULL
+    AND EXISTS (
+        SELECT 1 FROM filesystem_items AS earlier
+        WHERE earlier.parent_id IS NULL
+        AND earlier.owner_id = filesystem_items.owner_id
+        AND earlier.name = filesystem_items.name
+        AND earlier.id < filesystem_items.id
+    )
+"""
+RENAME_PASSES = 5
+DUPLICATE_ROOT_NAMES = """
+    SELECT owner_id, name FROM filesystem_items
+    WHERE parent_id IS NULL
+    GROUP BY owner_id, name
+    HAVING COUNT(*) > 1
+"""
+
 
-    # Import Flask app to get database context
-    from app_factory import create_app
+def rename_duplicate_root_names():
+    """Rename repeated names at the root, returning whether none are left"""
+    with db.engine.begin() as conn:
+        # Repeated in case a new name is itself taken, by "report.pdf (42)" say
+        for _ in range(RENAME_PASSES):
+            renamed = conn.execute(db.text(RENAME_DUPLICATE_ROOT_NAMES)).rowcount
+            if not renamed:
+                break
+            logger.info("Renamed %d items whose names repeated another item's at the root", renamed)
+        remaining = conn.execute(db.text(DUPLICATE_ROOT_NAMES)).fetchall()
 
-    app = create_app("operations")
+    if remaining:
+        logger.error(
+            "Items at the root still share a name, rename them and run again: %s",
+            ", ".join(f"owner {owner_id} {name!r}" for owner_id, name in remaining),
+        )
+        return False
+    return True
+
+
+def create_lookup_indexes():
+    """Create the indexes behind the owner/parent listing and permission lookups
+
+    The same indexes the models declare and the Alembic revisions 5e1f0c7a9d42,
+    8a3d6b1f2c57, c4e7a2d91b30 and e3a81c5f0d64 create, for databases that were
+    set up with this script instead.
+    """
+    try:
+        logger.info("Creating lookup indexes...")
+
+        create_indexes(
+            [
+                ("ix_fsi_owner_parent_id", "filesystem_items", "(owner_id, parent_id, id)"),
+                ("ix_filesystem_items_parent_id", "filesystem_items", "(parent_id)"),
+                ("ix_file_permissions_user_id", "file_permissions", "(user_id)"),
+                ("ix_fsi_owner_sha256", "filesystem_items", "(owner_id, content_sha256)"),
+            ]
+        )
+        # Superseded by ix_fsi_owner_parent_id, which leads with the same columns
+        drop_indexes(["ix_fsi_owner_parent"])
+        # Names at the root, where the NULL parent_id slips past
+        # unique_name_per_location_per_owner
+        if not rename_duplicate_root_names():
+            return False
+        create_indexes(
+            [("uq_fsi_owner_root_name", "filesystem_items", "(owner_id, name) WHERE parent_id IS NULL")], unique=True
+        )
+
+        logger.info("Successfully created lookup indexes")
+        return True
+
+    except Exception as e:
+        logger.error("Failed to create lookup indexes: %s", str(e))
+        return False
+
+
+def migrate(app=None):
+    """Run every step against the operations app's database, returning success
+
+    As with setup_database(), app can be passed in to reuse its engine.
+    """
+    if app is None:
+        # Import Flask app to get database context
+        from app_factory import create_app
+
+        app = create_app("operations")
 
     with app.app_context():
         logger.info("Starting database migration for content extraction...")
@@ -101,9 +253,25 @@ if __name__ == "__main__":
         if not create_search_index():
             success = False
 
+        if not add_search_vector():
+            success = False
+
+        if not create_lookup_indexes():
+            success = False
+
         if success:
             logger.info("Database migration completed successfully!")
-            sys.exit(0)
         else:
             logger.error("Database migration failed!")
-            sys.exit(1)
+        return success
+
+
+def main():
+    """Main entry point"""
+    # Setup logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(0 if migrate() else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,14 +16,28 @@ from flask_migrate import init, upgrade
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+REQUIRED_TABLES = ("users", "filesystem_items", "file_permissions")
 
-def setup_database():
-    """Setup database with all tables and migrations"""
+# Only the names missing, from one query, rather than every table in the schema
+# brought back to be searched in Python.
+MISSING_TABLES = db.text(
+    "SELECT name FROM unnest(CAST(:required AS TEXT[])) AS name "
+    "EXCEPT SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
+)
+
+
+def setup_database(app=None):
+    """Setup database with all tables and migrations
+
+    app is the operations app to set up through, so a caller that goes on to
+    migrate can share its engine and pooled connection. One is created if not.
+    """
     try:
         logger.info("Starting database setup...")
 
         # Create app instance
-        app = create_app("operations")
+        if app is None:
+            app = create_app("operations")
 
         with app.app_context():
             logger.info("Testing database connection...")
@@ -59,19 +73,13 @@ def setup_database():
 
             # Verify tables exist
             logger.info("Verifying database tables...")
-            result = db.session.execute(
-                db.text("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
-            )
-            tables = [row[0] for row in result]
-
-            required_tables = ["users", "filesystem_items", "file_permissions"]
-            missing_tables = [table for table in required_tables if table not in tables]
+            missing_tables = [row[0] for row in db.session.execute(MISSING_TABLES, {"required": list(REQUIRED_TABLES)})]
 
             if missing_tables:
                 logger.error("❌ Missing tables: %s", missing_tables)
                 return False
 
-            logger.info("✅ All required tables verified: %s", required_tables)
+            logger.info("✅ All required tables verified: %s", list(REQUIRED_TABLES))
             logger.info("📊 Database setup completed successfully!")
 
             return True
@@ -8,15 +8,22 @@ appearing to cover it.
     python scripts/smoke_extractor.py
 """
 
+import functools
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 EXTRACTOR_URL = "http://localhost:6004"
+# Every request goes to the one extractor, so they share its kept-alive
+# connections rather than opening a new one each.
+SESSION = requests.Session()
 
 
 def test_extractor_health():
     """Test if extractor is running"""
     try:
-        response = requests.get(f"{EXTRACTOR_URL}/health", timeout=5)
+        response = SESSION.get(f"{EXTRACTOR_URL}/health", timeout=5)
         print(f"Health check: {response.status_code}")
         print(f"Response: {response.json()}")
         return response.status_code == 200
@@ -25,33 +32,41 @@ def test_extractor_health():
         return False
 
 
-def test_extract_job():
+def test_extract_job(out=print):
     """Test adding a job to extraction queue"""
     try:
         # Test with a fake file ID (should fail gracefully)
         data = {"file_id": 999, "file_path": "fake_path"}
-        response = requests.post(f"{EXTRACTOR_URL}/extract", json=data, timeout=5)
-        print(f"Extract job: {response.status_code}")
-        print(f"Response: {response.json()}")
+        response = SESSION.post(f"{EXTRACTOR_URL}/extract", json=data, timeout=5)
+        out(f"Extract job: {response.status_code}")
+        out(f"Response: {response.json()}")
         return response.status_code in [200, 404]  # 404 is OK for fake file
     except Exception as e:
-        print(f"Extract job failed: {e}")
+        out(f"Extract job failed: {e}")
         return False
 
 
-def test_extraction_status():
+def test_extraction_status(out=print):
     """Test getting extraction status"""
     try:
         # Test with a fake file ID
-        response = requests.get(f"{EXTRACTOR_URL}/status/999", timeout=5)
-        print(f"Status check: {response.status_code}")
-        print(f"Response: {response.json()}")
+        response = SESSION.get(f"{EXTRACTOR_URL}/status/999", timeout=5)
+        out(f"Status check: {response.status_code}")
+        out(f"Response: {response.json()}")
         return response.status_code in [200, 404]  # Both OK
     except Exception as e:
-        print(f"Status check failed: {e}")
+        out(f"Status check failed: {e}")
         return False
 
 
+def run_check(check):
+    """Run one check, capturing what it prints"""
+    heading, function, label = check
+    buffer = io.StringIO()
+    passed = function(functools.partial(print, file=buffer))
+    return heading, buffer.getvalue(), passed, label
+
+
 def main():
     print("Testing Text Extractor Service")
     print("=" * 40)
@@ -64,19 +79,18 @@ def main():
 
     print("✅ Extractor is running")
 
-    # Test 2: Extract job
-    print("\n2. Extract Job Test:")
-    if test_extract_job():
-        print("✅ Extract endpoint working")
-    else:
-        print("❌ Extract endpoint failed")
-
-    # Test 3: Status check
-    print("\n3. Status Check Test:")
-    if test_extraction_status():
-        print("✅ Status endpoint working")
-    else:
-        print("❌ Status endpoint failed")
+    # Tests 2 and 3 are independent, so they run at once, each writing into a
+    # buffer of its own that is printed in order when both are done
+    checks = [
+        ("\n2. Extract Job Test:", test_extract_job, "Extract endpoint"),
+        ("\n3. Status Check Test:", test_extraction_status, "Status endpoint"),
+    ]
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        results = executor.map(run_check, checks)
+        for heading, output, passed, label in results:
+            print(heading)
+            print(output, end="")
+            print(f"✅ {label} working" if passed else f"❌ {label} failed")
 
     print("\n" + "=" * 40)
     print("Test completed!")
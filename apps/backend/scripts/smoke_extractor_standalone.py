@@ -1,10 +1,22 @@
 """
 Test script for text extractor standalone testing
+
+Needs the extractor started with EXTRACTOR_TEST_ROUTES=true, which serves the
+/test routes this calls.
 """
 
+import functools
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 EXTRACTOR_URL = "http://localhost:6004"
+# How many files are checked at once
+TEST_WORKERS = 8
+# Every request goes to the one extractor, so they share its kept-alive
+# connections rather than opening a new one each.
+SESSION = requests.Session()
 
 
 def test_list_files():
@@ -13,7 +25,7 @@ def test_list_files():
     print("=" * 50)
 
     try:
-        response = requests.get(f"{EXTRACTOR_URL}/test/files")
+        response = SESSION.get(f"{EXTRACTOR_URL}/test/files")
         data = response.json()
 
         if response.status_code == 200:
@@ -47,58 +59,77 @@ def test_list_files():
         return []
 
 
-def test_extract_file(file_id):
+def test_extract_file(file_id, out=print):
     """Test extraction for a specific file"""
-    print(f"\n🔬 Testing Extraction for File ID: {file_id}")
-    print("=" * 50)
+    out(f"\n🔬 Testing Extraction for File ID: {file_id}")
+    out("=" * 50)
 
     try:
-        response = requests.post(f"{EXTRACTOR_URL}/test/extract/{file_id}")
+        response = SESSION.post(f"{EXTRACTOR_URL}/test/extract/{file_id}")
         data = response.json()
 
         if response.status_code == 200:
-            print("✅ Extraction Test SUCCESSFUL!")
-            print(f"File: {data['file_name']}")
-            print(f"Storage: {data['storage_type']}")
-            print(f"Content Size: {data['content_length']} bytes")
-            print(f"Extracted Text: {data['extracted_text_length']} characters")
-            print(f"Preview: {data['extracted_preview']}")
+            out("✅ Extraction Test SUCCESSFUL!")
+            out(f"File: {data['file_name']}")
+            out(f"Storage: {data['storage_type']}")
+            out(f"Content Size: {data['content_length']} bytes")
+            out(f"Extracted Text: {data['extracted_text_length']} characters")
+            out(f"Preview: {data['extracted_preview']}")
         else:
-            print("❌ Extraction Test FAILED!")
-            print(f"Error: {data['error']}")
+            out("❌ Extraction Test FAILED!")
+            out(f"Error: {data['error']}")
             if "details" in data:
-                print(f"Details: {data['details']}")
+                out(f"Details: {data['details']}")
             if "file_path" in data:
-                print(f"File Path: {data['file_path']}")
+                out(f"File Path: {data['file_path']}")
 
     except Exception as e:
-        print(f"❌ Connection error: {e}")
+        out(f"❌ Connection error: {e}")
 
 
-def get_file_status(file_id):
+def get_file_status(file_id, out=print):
     """Get detailed status of a file"""
-    print(f"\n📊 File Status for ID: {file_id}")
-    print("=" * 50)
+    out(f"\n📊 File Status for ID: {file_id}")
+    out("=" * 50)
 
     try:
-        response = requests.get(f"{EXTRACTOR_URL}/status/{file_id}")
+        response = SESSION.get(f"{EXTRACTOR_URL}/status/{file_id}")
         data = response.json()
 
         if response.status_code == 200:
-            print(f"File: {data['file_name']}")
-            print(f"Path: {data['file_path']}")
-            print(f"Type: {data['mime_type']}")
-            print(f"Size: {data['size']} bytes")
-            print(f"Extracted: {'✅' if data['content_extracted'] else '❌'}")
-            print(f"Has Content: {'✅' if data['has_content'] else '❌'}")
+            out(f"File: {data['file_name']}")
+            out(f"Path: {data['file_path']}")
+            out(f"Type: {data['mime_type']}")
+            out(f"Size: {data['size']} bytes")
+            out(f"Extracted: {'✅' if data['content_extracted'] else '❌'}")
+            out(f"Has Content: {'✅' if data['has_content'] else '❌'}")
 
             if data["extraction_error"]:
-                print(f"❌ Error: {data['extraction_error']}")
+                out(f"❌ Error: {data['extraction_error']}")
         else:
-            print(f"❌ Error: {data}")
+            out(f"❌ Error: {data}")
 
     except Exception as e:
-        print(f"❌ Connection error: {e}")
+        out(f"❌ Connection error: {e}")
+
+
+def check_file(file_info):
+    """Status, then a test extraction if the file exists, returned as text"""
+    buffer = io.StringIO()
+    out = functools.partial(print, file=buffer)
+    file_id = file_info["id"]
+
+    # Get current status
+    get_file_status(file_id, out)
+
+    # Test extraction if file exists
+    if file_info["file_exists"]:
+        test_extract_file(file_id, out)
+    else:
+        out(f"⚠️  Skipping file {file_id} - file not found in storage")
+
+    out("-" * 50)
+    return buffer.getvalue()
 
 
 def main():
@@ -108,7 +139,7 @@ def main():
 
     # Test health first
     try:
-        response = requests.get(f"{EXTRACTOR_URL}/health")
+        response = SESSION.get(f"{EXTRACTOR_URL}/health")
         if response.status_code == 200:
             print("✅ Extractor is healthy and running")
         else:
@@ -125,20 +156,11 @@ def main():
         print("No files found for testing. Upload some PDF files first.")
         return
 
-    # Test extraction for each file
-    for file_info in files:
-        file_id = file_info["id"]
-
-        # Get current status
-        get_file_status(file_id)
-
-        # Test extraction if file exists
-        if file_info["file_exists"]:
-            test_extract_file(file_id)
-        else:
-            print(f"⚠️  Skipping file {file_id} - file not found in storage")
-
-        print("-" * 50)
+    # Test every file at once, each writing into a buffer of its own, then
+    # print the buffers in order so no two files' output interleaves
+    with ThreadPoolExecutor(max_workers=TEST_WORKERS) as executor:
+        for output in executor.map(check_file, files):
+            print(output, end="")
 
 
 if __name__ == "__main__":
@@ -2,43 +2,47 @@
 Simple startup script for development with text extraction
 """
 
+import os
 import subprocess
 import sys
 
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The setup scripts are imported and run in this process, rather than each
+# started as a fresh interpreter that imports the whole app again. They import
+# app_factory, which lives in the backend directory above this one.
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+
 
 def check_and_setup_database():
     """Check database and run setup if needed"""
+    from app_factory import create_app
+    from migrate_content_fields import migrate
+    from setup_database import setup_database
+
     print("Checking database...")
 
     # Try to run database setup (it will skip if already set up)
     try:
-        result = subprocess.run(
-            [sys.executable, "setup_database.py"], capture_output=True, text=True, check=False, timeout=60
-        )
+        # One app, so setup and migration share an engine and its connection
+        app = create_app("operations")
 
-        if result.returncode == 0:
+        if setup_database(app):
             print("Database setup verified")
         else:
-            print("Database setup failed:", result.stderr)
+            print("Database setup failed, see the errors above")
             return False
 
-    except subprocess.TimeoutExpired:
-        print("Database setup timed out")
-        return False
     except Exception as e:
         print(f"Error checking database: {e}")
         return False
 
     # Run content migration
     try:
-        result = subprocess.run(
-            [sys.executable, "migrate_content_fields.py"], capture_output=True, text=True, check=False, timeout=30
-        )
-
-        if result.returncode == 0:
+        if migrate(app):
             print("Content fields migration completed")
         else:
-            print("Migration output:", result.stdout)
+            print("Content fields migration reported errors, see above")
 
     except Exception as e:
         print(f"Migration error: {e}")
@@ -58,7 +62,7 @@ def main():
 
     # Start the full service stack
     try:
-        subprocess.run([sys.executable, "start_local_with_extractor.py"], check=True)
+        subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, "start_local_with_extractor.py")], check=True)
     except KeyboardInterrupt:
         print("\nShutting down...")
     except subprocess.CalledProcessError as e:
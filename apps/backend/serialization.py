@@ -0,0 +1,101 @@
+"""JSON encoding for large response bodies.
+
+A directory listing is hundreds of rows, and building a dict per row and then
+walking it again with the standard library encoder is most of what the endpoint
+spends its time on. orjson does the encoding, datetimes included, in C. It is
+optional: without it the standard library produces byte for byte the same
+output, only slower.
+"""
+
+import datetime
+import json
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def _default(value):
+    # The same ISO 8601 text orjson writes for a naive datetime, which is also
+    # what to_dict() has always produced with isoformat().
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize obj to UTF-8 JSON bytes."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_response(obj, status=200):
+    """A JSON Response, the equivalent of jsonify for large payloads."""
+    return Response(dumps(obj), status=status, mimetype="application/json")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with orjson doing the work when it is installed.
+
+    For jsonify, request.get_json and the test client's get_json. The output
+    matches the default provider's: keys sorted, and datetimes, UUIDs and the
+    rest handed to the same default() hook, which orjson would otherwise
+    format itself.
+    """
+
+    def _option(self, kwargs):
+        """The orjson option for json.dumps kwargs, or None if it has no equivalent.
+
+        Flask itself only ever passes separators=(",", ":") or indent=2, the
+        compact and the debug layouts, and both map onto orjson's output.
+        """
+        if not HAS_ORJSON:
+            return None
+        kwargs = dict(kwargs)
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        indent = kwargs.pop("indent", None)
+        separators = kwargs.pop("separators", None)
+        if kwargs.pop("default", self.default) is not self.default:
+            return None
+        kwargs.pop("ensure_ascii", None)
+        if kwargs:
+            return None
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if indent == 2 and separators in (None, (",", ": ")):
+            option |= orjson.OPT_INDENT_2
+        elif indent is not None or separators not in (None, (",", ":")):
+            return None
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._option(kwargs)
+        if option is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        # json.loads hooks such as object_hook have no orjson counterpart.
+        if not HAS_ORJSON or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # The same body DefaultJSONProvider.response builds, written straight
+        # to bytes rather than through a str.
+        if not HAS_ORJSON:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        option = self._option({"indent": 2} if pretty else {"separators": (",", ":")})
+        body = orjson.dumps(obj, default=self.default, option=option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -10,6 +10,9 @@ verification entirely. That put a bypass in shipped code, and its localhost
 guard did not hold behind the nginx these processes run under.
 """
 
+import shutil
+from pathlib import Path
+
 import pytest
 from app_factory import create_app
 from database import db
@@ -19,6 +22,7 @@ from models import FileSystemItem, User
 OWNER = "auth0|owner"
 OTHER = "auth0|other"
 TOKEN_PREFIX = "token-for-"
+SAMPLE_PDF = Path(__file__).resolve().parents[3] / "e2e" / "fixtures" / "test-document.pdf"
 
 
 def _payload_for(auth0_id):
@@ -56,17 +60,36 @@ def stub_jwt_verification(monkeypatch):
     monkeypatch.setattr(auth, "verify_decode_jwt", fake_verify)
 
 
-@pytest.fixture(scope="function")
-def app(tmp_path, monkeypatch):
-    # A file, not sqlite:///:memory:. Each connection to an in-memory SQLite
-    # gets its own empty database, so rows written by a fixture are invisible to
-    # the request handler. Set before create_app, because that is where the
-    # engine is bound.
-    # as_posix, because a Windows path with backslashes does not survive being
-    # pasted into a sqlite:/// URI.
-    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{(tmp_path / 'test.db').as_posix()}")
-
-    app = create_app("operations")
+@pytest.fixture(scope="session")
+def _app(tmp_path_factory):
+    """The app, built once for the session, and a template of its database.
+
+    Building an app binds the engine and registers every blueprint, which is
+    most of what a test in this suite costs, so the tests share one. The
+    template holds the schema and both users; each test starts from a copy of
+    it, which is far cheaper than running every CREATE TABLE and CREATE INDEX
+    again, and leaves tests as isolated as a fresh database would.
+
+    Under pytest-xdist each worker is its own process with its own basetemp,
+    so each builds its own app and database and the workers share nothing.
+    """
+    directory = tmp_path_factory.mktemp("db")
+    database_path = directory / "test.db"
+    template_path = directory / "template.db"
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # A file, not sqlite:///:memory:. Each connection to an in-memory SQLite
+        # gets its own empty database, so rows written by a fixture are
+        # invisible to the request handler. Set before create_app, because that
+        # is where the engine is bound.
+        # as_posix, because a Windows path with backslashes does not survive
+        # being pasted into a sqlite:/// URI.
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{database_path.as_posix()}")
+        # The tables do not exist until create_all below, so the startup probe
+        # would only ever log against an empty file.
+        monkeypatch.setenv("APP_STARTUP_DB_CHECK", "0")
+        app = create_app("operations")
+
     app.config["TESTING"] = True
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.test_client_class = AuthedClient
@@ -83,17 +106,38 @@ def app(tmp_path, monkeypatch):
             handle = auth0_id.split("|")[-1]
             db.session.add(User(auth0_id=auth0_id, email=f"{handle}@example.com", name=handle))
         db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+    shutil.copyfile(database_path, template_path)
+
+    return app, database_path, template_path
+
+
+@pytest.fixture(scope="function")
+def app(_app):
+    app, database_path, template_path = _app
+    # No connection is open here: the previous test closed them all, so the
+    # file can be replaced under the engine.
+    shutil.copyfile(template_path, database_path)
 
+    with app.app_context():
         yield app
 
         db.session.remove()
-        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def _client(_app):
+    # A test client keeps nothing between requests but cookies, and nothing in
+    # the API sets any, so one can serve every test.
+    return _app[0].test_client()
 
 
 @pytest.fixture
-def client(app):
+def client(app, _client):
     """Authenticated as OWNER."""
-    return app.test_client()
+    return _client
 
 
 @pytest.fixture
@@ -143,3 +187,20 @@ def other_users_item(app):
         db.session.commit()
         db.session.refresh(item)
         return item
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Local file storage under tmp_path instead of ./uploads."""
+    import routes_operations
+
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    monkeypatch.setattr(routes_operations, "UPLOAD_FOLDER", str(directory))
+    monkeypatch.setattr(routes_operations, "USE_GCS", False)
+    return directory
+
+
+@pytest.fixture
+def sample_pdf():
+    return SAMPLE_PDF.read_bytes()
@@ -1,33 +1,40 @@
 import json
 
+import pytest
+
+
+def _by_name(items):
+    """Serialized items keyed by name."""
+    return {item["name"]: item for item in items}
+
 
 class TestFileSystemAPI:
 
     def test_health_check(self, client):
         response = client.get("/api/health")
         assert response.status_code == 200
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert response_data["status"] == "healthy"
 
     def test_get_root_items_empty(self, client):
         response = client.get("/api/filesystem")
         assert response.status_code == 200
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "items" in response_data
         assert isinstance(response_data["items"], list)
 
     def test_get_root_items_with_data(self, client, sample_item):  # noqa: ARG002
         response = client.get("/api/filesystem")
         assert response.status_code == 200
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "items" in response_data
         assert len(response_data["items"]) >= 1
-        assert any(item["name"] == "Test Folder" for item in response_data["items"])
+        assert "Test Folder" in _by_name(response_data["items"])
 
     def test_get_item_by_id(self, client, sample_item):
         response = client.get(f"/api/filesystem/{sample_item.id}")
         assert response.status_code == 200
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert response_data["name"] == "Test Folder"
         assert response_data["type"] == "folder"
         assert response_data["id"] == str(sample_item.id)  # ID returned as string now
@@ -35,49 +42,89 @@ class TestFileSystemAPI:
     def test_get_item_not_found(self, client):
         response = client.get("/api/filesystem/999999")
         assert response.status_code == 404
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "error" in response_data
 
     def test_create_folder(self, client):
         data = {"name": "New Folder", "type": "folder", "parent_id": None}
-        response = client.post("/api/filesystem", data=json.dumps(data), content_type="application/json")
+        response = client.post("/api/filesystem", json=data)
 
         assert response.status_code == 201
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert response_data["name"] == "New_Folder"  # Sanitized name
         assert response_data["type"] == "folder"
         assert "id" in response_data
 
     def test_create_item_missing_name(self, client):
         data = {"type": "folder"}
-        response = client.post("/api/filesystem", data=json.dumps(data), content_type="application/json")
+        response = client.post("/api/filesystem", json=data)
 
         assert response.status_code == 400
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "error" in response_data
 
     def test_update_item(self, client, sample_item):
         data = {"name": "Updated Folder"}
-        response = client.put(
-            f"/api/filesystem/{sample_item.id}",
-            data=json.dumps(data),
-            content_type="application/json",
-        )
+        response = client.put(f"/api/filesystem/{sample_item.id}", json=data)
 
         assert response.status_code == 200
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert response_data["name"] == "Updated_Folder"  # Sanitized name
 
     def test_update_item_not_found(self, client):
         data = {"name": "Updated Folder"}
-        response = client.put(
-            "/api/filesystem/999999",
-            data=json.dumps(data),
-            content_type="application/json",
-        )
+        response = client.put("/api/filesystem/999999", json=data)
 
         assert response.status_code == 404
 
+    def test_duplicate_name_at_root_is_rejected(self, client):
+        """Caught by the partial index: parent_id is NULL, which the unique constraint ignores."""
+        data = {"name": "Reports", "type": "folder", "parent_id": None}
+        assert client.post("/api/filesystem", json=data).status_code == 201
+        response = client.post("/api/filesystem", json=data)
+        assert response.status_code == 409
+        assert "already exists" in response.get_json()["error"]
+
+    def test_duplicate_name_in_a_folder_is_rejected(self, client, sample_item):
+        data = {"name": "Reports", "type": "folder", "parent_id": sample_item.id}
+        assert client.post("/api/filesystem", json=data).status_code == 201
+        assert client.post("/api/filesystem", json=data).status_code == 409
+
+    def test_rename_onto_a_sibling_is_rejected(self, client, sample_item):
+        client.post("/api/filesystem", json={"name": "Sibling", "type": "folder"})
+        response = client.put(f"/api/filesystem/{sample_item.id}", json={"name": "Sibling"})
+        assert response.status_code == 409
+
+    def test_listing_a_folder_includes_its_breadcrumb(self, client, sample_item):
+        data = {"name": "Inner", "type": "folder", "parent_id": sample_item.id}
+        inner = client.post("/api/filesystem", json=data).get_json()
+
+        breadcrumb = client.get(f"/api/filesystem?parent_id={inner['id']}").get_json()["breadcrumb"]
+        assert [crumb["id"] for crumb in breadcrumb] == [sample_item.id, int(inner["id"])]
+        assert breadcrumb[1]["created_at"] == inner["created_at"]
+
+    def test_unchanged_update_writes_nothing(self, client):
+        from database import db
+        from sqlalchemy import event
+
+        item = client.post("/api/filesystem", json={"name": "Reports", "type": "folder"}).get_json()
+        updates = []
+
+        def record(conn, cursor, statement, *args):
+            if statement.startswith("UPDATE filesystem_items"):
+                updates.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = client.put(f"/api/filesystem/{item['id']}", json={"name": "Reports", "parent_id": None})
+            assert response.status_code == 200
+            assert updates == []
+
+            client.put(f"/api/filesystem/{item['id']}", json={"name": "Renamed"})
+            assert len(updates) == 1
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
     def test_delete_item(self, client, sample_item):
         response = client.delete(f"/api/filesystem/{sample_item.id}")
         assert response.status_code == 200
@@ -94,7 +141,7 @@ class TestFileSystemAPI:
         response = client.get("/api/filesystem/search?q=Test")
         assert response.status_code == 200
 
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "results" in response_data
         assert "pagination" in response_data
         assert "query" in response_data
@@ -102,18 +149,14 @@ class TestFileSystemAPI:
 
         # Should find the sample item
         assert len(response_data["results"]) >= 1
-        found_item = next(
-            (item for item in response_data["results"] if item["name"] == "Test Folder"),
-            None,
-        )
-        assert found_item is not None
+        assert "Test Folder" in _by_name(response_data["results"])
 
     def test_search_files_with_type_filter(self, client, sample_item):  # noqa: ARG002
         # Search with type filter
         response = client.get("/api/filesystem/search?q=Test&type=folder")
         assert response.status_code == 200
 
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert len(response_data["results"]) >= 1
 
         # All results should be folders
@@ -125,7 +168,7 @@ class TestFileSystemAPI:
         response = client.get("/api/filesystem/search")
         assert response.status_code == 400
 
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         assert "error" in response_data
         assert "required" in response_data["error"].lower()
 
@@ -134,7 +177,7 @@ class TestFileSystemAPI:
         response = client.get("/api/filesystem/search?q=Test&limit=1&page=1")
         assert response.status_code == 200
 
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         pagination = response_data["pagination"]
 
         assert "current_page" in pagination
@@ -147,18 +190,46 @@ class TestFileSystemAPI:
         assert pagination["current_page"] == 1
         assert pagination["items_per_page"] == 1
 
+    def test_deep_search_page_still_reports_a_total(self, client, sample_item, monkeypatch):  # noqa: ARG002
+        """SQLite has no planner estimate, so a deep page falls back to counting."""
+        import routes_operations
+
+        monkeypatch.setattr(routes_operations, "EXACT_COUNT_MAX_OFFSET", 0)
+        pagination = client.get("/api/filesystem/search?q=Test").get_json()["pagination"]
+        assert pagination["total_items"] == 1
+        assert pagination["total_is_estimate"] is False
+
+    def test_search_cursor_walks_every_match_once(self, client, app):
+        from database import db
+        from models import FileSystemItem, User
+
+        with app.app_context():
+            user = User.query.filter_by(auth0_id="auth0|owner").first()
+            for index in range(7):
+                db.session.add(FileSystemItem(name=f"match-{index}", type="folder", owner_id=user.id))
+            db.session.commit()
+
+        url = "/api/filesystem/search?q=match&limit=3"
+        body = client.get(f"{url}&after_id=").get_json()
+        assert body["pagination"]["has_prev"] is False
+        seen = [item["name"] for item in body["results"]]
+        cursor = body["pagination"]["next_cursor"]
+        while cursor and len(seen) <= 7:
+            body = client.get(f"{url}&after_name={cursor['after_name']}&after_id={cursor['after_id']}").get_json()
+            assert body["pagination"]["has_prev"] is True
+            seen.extend(item["name"] for item in body["results"])
+            cursor = body["pagination"]["next_cursor"]
+
+        assert seen == [f"match-{index}" for index in range(7)]
+
     def test_search_files_case_insensitive(self, client, sample_item):  # noqa: ARG002
         # Test case-insensitive search
         response = client.get("/api/filesystem/search?q=test")
         assert response.status_code == 200
 
-        response_data = json.loads(response.data)
+        response_data = response.get_json()
         # Should find the "Test Folder" item even with lowercase query
-        found_item = next(
-            (item for item in response_data["results"] if item["name"] == "Test Folder"),
-            None,
-        )
-        assert found_item is not None
+        assert "Test Folder" in _by_name(response_data["results"])
 
 
 class TestAuthentication:
@@ -196,7 +267,7 @@ class TestAuthorization:
         response = client.get(f"/api/filesystem?parent_id={other_users_item.id}")
         assert response.status_code in (200, 404)
         if response.status_code == 200:
-            assert json.loads(response.data)["items"] == []
+            assert response.get_json()["items"] == []
 
     def test_cannot_update_another_users_item(self, client, other_users_item):
         response = client.put(
@@ -213,21 +284,21 @@ class TestAuthorization:
         """The mirror of the tests above: the real owner is not locked out."""
         response = other_client.get(f"/api/filesystem/{other_users_item.id}")
         assert response.status_code == 200
-        assert json.loads(response.data)["name"] == "Private"
+        assert response.get_json()["name"] == "Private"
 
     def test_listing_is_scoped_to_the_caller(self, client, other_client, sample_item):  # noqa: ARG002
         """Two users, one database, disjoint views."""
-        mine = json.loads(client.get("/api/filesystem").data)["items"]
-        theirs = json.loads(other_client.get("/api/filesystem").data)["items"]
+        mine = client.get("/api/filesystem").get_json()["items"]
+        theirs = other_client.get("/api/filesystem").get_json()["items"]
 
-        assert any(item["name"] == "Test Folder" for item in mine)
-        assert all(item["name"] != "Test Folder" for item in theirs)
+        assert "Test Folder" in _by_name(mine)
+        assert "Test Folder" not in _by_name(theirs)
 
 
 class TestPagination:
     def test_listing_is_paginated(self, client):
         response = client.get("/api/filesystem")
-        body = json.loads(response.data)
+        body = response.get_json()
         assert {"items", "total", "limit", "offset", "has_more"} <= set(body)
 
     def test_limit_is_respected(self, client, app):
@@ -240,17 +311,481 @@ class TestPagination:
                 db.session.add(FileSystemItem(name=f"folder-{index}", type="folder", owner_id=user.id, parent_id=None))
             db.session.commit()
 
-        body = json.loads(client.get("/api/filesystem?limit=5").data)
+        body = client.get("/api/filesystem?limit=5").get_json()
         assert len(body["items"]) == 5
         assert body["total"] == 12
         assert body["has_more"] is True
 
     def test_limit_is_capped(self, client):
         """A caller must not be able to ask for everything."""
-        body = json.loads(client.get("/api/filesystem?limit=100000").data)
+        body = client.get("/api/filesystem?limit=100000").get_json()
         assert body["limit"] <= 500
 
     def test_garbage_limit_falls_back_to_the_default(self, client):
-        body = json.loads(client.get("/api/filesystem?limit=abc&offset=xyz").data)
+        body = client.get("/api/filesystem?limit=abc&offset=xyz").get_json()
         assert body["limit"] == 100
         assert body["offset"] == 0
+
+
+class TestListingSerialization:
+    """The fast listing encoder must produce exactly what to_dict() always has."""
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_listing_rows_match_to_dict(self, client, app, sample_item, monkeypatch, use_orjson):
+        import serialization
+        from database import db
+        from models import FileSystemItem
+
+        if use_orjson and not serialization.HAS_ORJSON:
+            pytest.skip("orjson is not installed")
+        monkeypatch.setattr(serialization, "HAS_ORJSON", use_orjson)
+
+        listed = client.get("/api/filesystem").get_json()["items"]
+        with app.app_context():
+            expected = [db.session.get(FileSystemItem, sample_item.id).to_dict()]
+        assert listed == expected
+
+    def test_jsonify_matches_the_default_provider(self, app, monkeypatch):
+        import datetime
+        import decimal
+        import uuid
+
+        import serialization
+        from flask import jsonify
+        from flask.json.provider import DefaultJSONProvider
+
+        if not serialization.HAS_ORJSON:
+            pytest.skip("orjson is not installed")
+
+        calls = []
+        orjson_dumps = serialization.orjson.dumps
+
+        def counting_dumps(*args, **kwargs):
+            calls.append(args)
+            return orjson_dumps(*args, **kwargs)
+
+        monkeypatch.setattr(serialization.orjson, "dumps", counting_dumps)
+
+        value = {
+            "b": [1, 2.5, None, True],
+            "a": datetime.datetime(2024, 1, 2, 3, 4, 5),
+            "id": uuid.UUID(int=5),
+            "price": decimal.Decimal("1.50"),
+            "name": "Grüße",
+        }
+        body = jsonify(value).get_data()
+        assert calls
+        assert json.loads(body) == json.loads(DefaultJSONProvider(app).response(value).get_data())
+        assert list(json.loads(body)) == ["a", "b", "id", "name", "price"]
+        assert body.startswith(b'{"a":') and body.endswith(b"}\n")
+
+
+class TestCors:
+    def test_preflight_is_answered(self, anonymous_client):
+        response = anonymous_client.options(
+            "/api/filesystem",
+            headers={
+                "Origin": "http://localhost:5173",
+                "Access-Control-Request-Method": "POST",
+                "Access-Control-Request-Headers": "authorization, content-type",
+            },
+        )
+        assert response.status_code == 200
+        assert response.headers["Access-Control-Allow-Origin"] == "http://localhost:5173"
+        assert "POST" in response.headers["Access-Control-Allow-Methods"]
+        assert response.headers["Access-Control-Allow-Headers"] == "authorization, content-type"
+
+    def test_same_origin_request_gets_no_cors_headers(self, client):
+        assert "Access-Control-Allow-Origin" not in client.get("/api/health").headers
+
+
+class TestLastLogin:
+    def _last_login(self, app):
+        from models import User
+
+        with app.app_context():
+            return User.query.filter_by(auth0_id="auth0|owner").first().last_login
+
+    def _set_last_login(self, app, value):
+        from database import db
+        from models import User
+
+        with app.app_context():
+            User.query.filter_by(auth0_id="auth0|owner").update({"last_login": value})
+            db.session.commit()
+
+    def test_recent_login_is_not_rewritten(self, client, app):
+        from datetime import datetime, timedelta, timezone
+
+        recent = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(seconds=30)
+        self._set_last_login(app, recent)
+        client.get("/api/filesystem")
+        assert self._last_login(app) == recent
+
+    def test_stale_login_is_refreshed(self, client, app):
+        from datetime import datetime
+
+        stale = datetime(2000, 1, 1)
+        self._set_last_login(app, stale)
+        client.get("/api/filesystem")
+        assert self._last_login(app) > stale
+
+    def test_user_is_looked_up_once_per_request(self, app):
+        from auth import get_or_create_user
+        from database import db
+        from flask import g
+        from models import User
+        from sqlalchemy import event
+
+        statements = []
+        with app.test_request_context():
+            g.current_user_auth0_id = "auth0|owner"
+            listener = lambda *args: statements.append(args[2])  # noqa: E731
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                first = get_or_create_user(db, User)
+                second = get_or_create_user(db, User)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+
+        assert first is second
+        assert len(statements) == 1
+
+
+class TestUpload:
+    def _upload(self, client, content, filename="report.pdf", **form):
+        from io import BytesIO
+
+        return client.post(
+            "/api/filesystem/upload",
+            data={"file": (BytesIO(content), filename), **form},
+            content_type="multipart/form-data",
+        )
+
+    def test_upload_stores_the_file(self, client, upload_dir, sample_pdf):
+        response = self._upload(client, sample_pdf)
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body["name"] == "report.pdf"
+        assert body["size"] == len(sample_pdf)
+        assert (upload_dir / f"{body['id']}.pdf").read_bytes() == sample_pdf
+
+    def test_large_upload_is_stored_intact(self, client, upload_dir, sample_pdf):
+        """Big enough for Werkzeug to spool it to a file, which is copied with sendfile."""
+        # A comment and a fresh trailer after the original, the way an
+        # incremental save leaves a file, pointing back at the same xref.
+        startxref = sample_pdf.rpartition(b"startxref")[2]
+        content = sample_pdf + b"%" + b"x" * (2 * 1024 * 1024) + b"\nstartxref" + startxref
+        body = self._upload(client, content).get_json()
+        assert (upload_dir / f"{body['id']}.pdf").read_bytes() == content
+
+    def test_duplicate_upload_name_is_rejected_before_storing(self, client, upload_dir, sample_pdf):
+        assert self._upload(client, sample_pdf).status_code == 201
+        response = self._upload(client, sample_pdf)
+        assert response.status_code == 409
+        assert len(list(upload_dir.iterdir())) == 1
+
+    def test_truncated_pdf_is_rejected(self, client, upload_dir, sample_pdf):
+        response = self._upload(client, sample_pdf[: len(sample_pdf) // 2])
+        assert response.status_code == 400
+        assert "startxref" in response.get_json()["error"]
+        assert list(upload_dir.iterdir()) == []
+
+    def test_startxref_past_the_end_is_rejected(self, client, upload_dir, sample_pdf):  # noqa: ARG002
+        response = self._upload(client, sample_pdf.replace(b"startxref\n1269", b"startxref\n999999"))
+        assert response.status_code == 400
+
+    def test_repeat_upload_is_stored_as_a_copy(self, client, upload_dir, sample_pdf):
+        import hashlib
+
+        first = self._upload(client, sample_pdf).get_json()
+        second = self._upload(client, sample_pdf, filename="again.pdf").get_json()
+
+        assert first["content_sha256"] == second["content_sha256"] == hashlib.sha256(sample_pdf).hexdigest()
+        first_file = upload_dir / f"{first['id']}.pdf"
+        second_file = upload_dir / f"{second['id']}.pdf"
+        assert second_file.read_bytes() == sample_pdf
+        assert second_file.stat().st_ino == first_file.stat().st_ino
+
+        client.delete(f"/api/filesystem/{first['id']}")
+        assert second_file.read_bytes() == sample_pdf
+
+    def test_upload_is_hashed_while_spooled(self, client, upload_dir, sample_pdf, monkeypatch):  # noqa: ARG002
+        import hashlib
+
+        import routes_operations
+
+        def fail(stream):
+            raise AssertionError("the upload was read back a second time to hash it")
+
+        monkeypatch.setattr(routes_operations, "stream_sha256", fail)
+        body = self._upload(client, sample_pdf).get_json()
+        assert body["content_sha256"] == hashlib.sha256(sample_pdf).hexdigest()
+
+    def test_non_pdf_content_is_rejected(self, client, upload_dir):
+        response = self._upload(client, b"just some text, not a pdf at all")
+        assert response.status_code == 400
+        assert list(upload_dir.iterdir()) == []
+
+    def test_unknown_pdf_version_is_rejected(self, client, upload_dir, sample_pdf):  # noqa: ARG002
+        response = self._upload(client, b"%PDF-9.9" + sample_pdf[8:])
+        assert response.status_code == 400
+        assert "version" in response.get_json()["error"]
+
+    def test_oversized_upload_is_rejected_before_parsing(self, client, upload_dir, monkeypatch, sample_pdf):
+        import routes_operations
+
+        monkeypatch.setattr(routes_operations, "MAX_UPLOAD_REQUEST_SIZE", 100)
+        response = self._upload(client, sample_pdf)
+        assert response.status_code == 400
+        assert "too large" in response.get_json()["error"]
+
+    def test_failed_storage_write_leaves_no_row(self, client, upload_dir, sample_pdf, monkeypatch):  # noqa: ARG002
+        import routes_operations
+
+        def fail(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(routes_operations, "store_upload", fail)
+        assert self._upload(client, sample_pdf).status_code == 500
+        assert client.get("/api/filesystem").get_json()["items"] == []
+
+    def test_local_download_is_tagged_with_the_content_hash(self, client, upload_dir, sample_pdf):  # noqa: ARG002
+        body = self._upload(client, sample_pdf).get_json()
+        url = f"/api/filesystem/{body['id']}/download"
+
+        response = client.get(url)
+        assert response.headers["ETag"] == f'"{body["content_sha256"]}"'
+        assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    def test_upload_does_not_wait_for_the_extractor(self, client, upload_dir, sample_pdf, monkeypatch):  # noqa: ARG002
+        import threading
+
+        import routes_operations
+
+        started, release = threading.Event(), threading.Event()
+        notified = []
+
+        def slow_post(url, json, timeout):
+            notified.append(json)
+            started.set()
+            release.wait(timeout=10)
+            raise routes_operations.requests.exceptions.ConnectionError("extractor down")
+
+        monkeypatch.setattr(routes_operations.EXTRACTOR_SESSION, "post", slow_post)
+        try:
+            response = self._upload(client, sample_pdf)
+            assert response.status_code == 201
+        finally:
+            release.set()
+        assert started.wait(timeout=10)
+        assert str(notified[0]["file_id"]) == response.get_json()["id"]
+
+    def test_uploaded_file_downloads_intact(self, client, upload_dir, sample_pdf):
+        item_id = self._upload(client, sample_pdf).get_json()["id"]
+        response = client.get(f"/api/filesystem/{item_id}/download")
+        assert response.status_code == 200
+        assert response.data == sample_pdf
+
+
+class TestSubtree:
+    """Deleting and searching a folder reach everything below it, and nothing else."""
+
+    @pytest.fixture
+    def tree(self, app):
+        from database import db
+        from models import FileSystemItem, User
+
+        with app.app_context():
+            user = User.query.filter_by(auth0_id="auth0|owner").first()
+
+            def add(name, kind, parent=None):
+                item = FileSystemItem(name=name, type=kind, owner_id=user.id, parent_id=parent.id if parent else None)
+                db.session.add(item)
+                db.session.flush()
+                return item
+
+            root = add("root", "folder")
+            middle = add("middle", "folder", root)
+            deep = add("deep", "folder", middle)
+            nested = add("needle-nested.pdf", "file", deep)
+            outside = add("needle-outside.pdf", "file")
+            ids = {"root": root.id, "middle": middle.id, "deep": deep.id, "nested": nested.id, "outside": outside.id}
+            db.session.commit()
+            return ids
+
+    def test_delete_removes_the_whole_subtree(self, client, tree, upload_dir):
+        stored = upload_dir / f"{tree['nested']}.pdf"
+        stored.write_bytes(b"%PDF-1.4")
+
+        assert client.delete(f"/api/filesystem/{tree['root']}").status_code == 200
+
+        for name in ("root", "middle", "deep", "nested"):
+            assert client.get(f"/api/filesystem/{tree[name]}").status_code == 404
+        assert client.get(f"/api/filesystem/{tree['outside']}").status_code == 200
+        assert not stored.exists()
+
+    def test_gcs_files_are_deleted_in_batches(self, client, app, tree, monkeypatch):
+        from contextlib import nullcontext
+
+        import routes_operations
+        from database import db
+        from models import FileSystemItem, User
+
+        with app.app_context():
+            user = User.query.filter_by(auth0_id="auth0|owner").first()
+            for index in range(150):
+                name = f"{index}.pdf"
+                db.session.add(FileSystemItem(name=name, type="file", owner_id=user.id, parent_id=tree["deep"]))
+            db.session.commit()
+
+        batches = []
+
+        class Bucket:
+            def delete_blobs(self, names):
+                batches.append(len(names))
+
+        class Client:
+            def batch(self, raise_exception=True):
+                assert raise_exception is False
+                return nullcontext()
+
+        monkeypatch.setattr(routes_operations, "USE_GCS", True)
+        monkeypatch.setattr(routes_operations, "bucket", Bucket(), raising=False)
+        monkeypatch.setattr(routes_operations, "storage_client", Client(), raising=False)
+
+        assert client.delete(f"/api/filesystem/{tree['root']}").status_code == 200
+        assert batches == [100, 51]
+
+    def test_search_under_a_folder_reaches_nested_items_only(self, client, tree):
+        body = client.get(f"/api/filesystem/search?q=needle&parent_id={tree['root']}").get_json()
+        assert [item["name"] for item in body["results"]] == ["needle-nested.pdf"]
+
+    @pytest.fixture
+    def gcs_objects(self, monkeypatch):
+        """Route GCS calls to an in-memory bucket: {object name: bytes}."""
+        import routes_operations
+        from google.api_core.exceptions import NotFound
+
+        objects = {}
+
+        class Blob:
+            def __init__(self, name, chunk_size=None):
+                self.name = name
+                self.chunk_size = chunk_size
+
+            def exists(self):
+                raise AssertionError("an exists() round trip was made first")
+
+            def download_as_bytes(self, start=None, end=None, checksum="auto"):
+                assert start is not None and end is not None, "the whole object was downloaded into memory"
+                if self.name not in objects:
+                    raise NotFound(self.name)
+                stop = end + 1
+                return objects[self.name][start:stop]
+
+            def generate_signed_url(self, version, expiration, method, response_disposition, response_type):
+                if self.name not in objects:
+                    raise ValueError("no private key to sign with")
+                return f"https://storage.test/{self.name}?disposition={response_disposition}"
+
+            def upload_from_file(self, stream, content_type, size, rewind, if_generation_match=None):
+                assert self.chunk_size % (256 * 1024) == 0
+                assert if_generation_match == 0, "a retried upload could overwrite an existing object"
+                stream.seek(0)
+                objects[self.name] = stream.read(size)
+
+        class Bucket:
+            def blob(self, name, chunk_size=None):
+                return Blob(name, chunk_size)
+
+        monkeypatch.setattr(routes_operations, "USE_GCS", True)
+        monkeypatch.setattr(routes_operations, "bucket", Bucket(), raising=False)
+        return objects
+
+    def test_upload_to_gcs(self, client, gcs_objects, sample_pdf):
+        from io import BytesIO
+
+        response = client.post(
+            "/api/filesystem/upload",
+            data={"file": (BytesIO(sample_pdf), "report.pdf")},
+            content_type="multipart/form-data",
+        )
+        body = response.get_json()
+        assert gcs_objects[body["path"]] == sample_pdf
+
+    def _file_item(self, app, name, content=b""):
+        import hashlib
+
+        from database import db
+        from models import FileSystemItem, User
+
+        with app.app_context():
+            user = User.query.filter_by(auth0_id="auth0|owner").first()
+            item = FileSystemItem(
+                name=name,
+                type="file",
+                owner_id=user.id,
+                mime_type="application/pdf",
+                size=len(content),
+                content_sha256=hashlib.sha256(content).hexdigest(),
+            )
+            db.session.add(item)
+            db.session.commit()
+            return item.id
+
+    def test_gcs_download_is_streamed_from_the_blob(self, client, app, sample_pdf, gcs_objects):
+        item_id = self._file_item(app, "cloud.pdf", sample_pdf)
+        gcs_objects[f"uploads/{item_id}.pdf"] = sample_pdf
+
+        response = client.get(f"/api/filesystem/{item_id}/download")
+        assert response.status_code == 200
+        assert response.data == sample_pdf
+
+    def test_gcs_download_revalidates_by_etag(self, client, app, sample_pdf, gcs_objects):
+        item_id = self._file_item(app, "cloud.pdf", sample_pdf)
+        gcs_objects[f"uploads/{item_id}.pdf"] = sample_pdf
+
+        etag = client.get(f"/api/filesystem/{item_id}/download").headers["ETag"]
+        gcs_objects.clear()  # A 304 must not need the object at all.
+        response = client.get(f"/api/filesystem/{item_id}/download", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+    def test_gcs_download_serves_a_range(self, client, app, sample_pdf, gcs_objects):
+        item_id = self._file_item(app, "cloud.pdf", sample_pdf)
+        gcs_objects[f"uploads/{item_id}.pdf"] = sample_pdf
+
+        response = client.get(f"/api/filesystem/{item_id}/download", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.data == sample_pdf[100:200]
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(sample_pdf)}"
+
+    def test_large_gcs_download_redirects_to_a_signed_url(self, client, app, sample_pdf, gcs_objects, monkeypatch):
+        import routes_operations
+
+        monkeypatch.setattr(routes_operations, "GCS_SIGNED_URL_MIN_SIZE", len(sample_pdf))
+        item_id = self._file_item(app, "big.pdf", sample_pdf)
+        gcs_objects[f"uploads/{item_id}.pdf"] = sample_pdf
+        response = client.get(f"/api/filesystem/{item_id}/download")
+        assert response.status_code == 302
+        assert response.headers["Location"].startswith("https://storage.test/")
+        assert "big.pdf" in response.headers["Location"]
+
+    def test_unsignable_download_is_streamed(self, client, app, sample_pdf, gcs_objects, monkeypatch):
+        import routes_operations
+
+        monkeypatch.setattr(routes_operations, "GCS_SIGNED_URL_MIN_SIZE", 1)
+        monkeypatch.setattr(routes_operations, "signed_download_url", lambda file_path, item: None)
+        item_id = self._file_item(app, "big.pdf", sample_pdf)
+        gcs_objects[f"uploads/{item_id}.pdf"] = sample_pdf
+        response = client.get(f"/api/filesystem/{item_id}/download")
+        assert response.status_code == 200
+        assert response.data == sample_pdf
+
+    def test_missing_gcs_object_is_a_404(self, client, app, gcs_objects):  # noqa: ARG002
+        item_id = self._file_item(app, "gone.pdf", b"%PDF-1.4 never stored")
+        assert client.get(f"/api/filesystem/{item_id}/download").status_code == 404
+
+    def test_missing_local_file_is_a_404(self, client, app, upload_dir):  # noqa: ARG002
+        item_id = self._file_item(app, "gone.pdf")
+        assert client.get(f"/api/filesystem/{item_id}/download").status_code == 404
@@ -0,0 +1,175 @@
+"""Tests for the caching underneath verify_decode_jwt.
+
+The request level tests in test_api.py stub verify_decode_jwt out entirely, so
+the key and token caches it relies on are exercised here directly.
+"""
+
+import time
+
+import auth
+import auth_cache
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+# Captured at import, before the autouse fixture in conftest.py swaps it out.
+real_verify_decode_jwt = auth.verify_decode_jwt
+
+
+KEY = object()
+
+
+@pytest.fixture
+def jwks_fetches(monkeypatch):
+    """Count key set downloads and serve a fixed key set instead of Auth0's."""
+    calls = []
+
+    def fake_fetch():
+        calls.append(1)
+        return {"kid-1": KEY}
+
+    monkeypatch.setattr(auth, "_fetch_jwks", fake_fetch)
+    monkeypatch.setitem(auth._JWKS_CACHE, "keys_by_kid", {})
+    monkeypatch.setitem(auth._JWKS_CACHE, "fetched_at", 0.0)
+    monkeypatch.setitem(auth._JWKS_CACHE, "last_refresh_at", 0.0)
+    monkeypatch.setitem(auth._JWKS_CACHE, "retry_at", 0.0)
+    monkeypatch.setattr(auth, "JWKS_CACHE_TTL", 300.0)
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_INTERVAL", 10.0)
+    return calls
+
+
+class TestJwksCache:
+    def test_key_set_is_fetched_once(self, jwks_fetches):
+        for _ in range(5):
+            assert auth._get_jwks("kid-1") is KEY
+        assert len(jwks_fetches) == 1
+
+    def test_unknown_kid_refreshes_at_most_once_per_interval(self, jwks_fetches):
+        auth._get_jwks("kid-1")
+        for _ in range(5):
+            assert auth._get_jwks("made-up") is None
+        assert len(jwks_fetches) == 1
+
+    def test_expired_key_set_is_refetched(self, jwks_fetches, monkeypatch):
+        auth._get_jwks("kid-1")
+        monkeypatch.setattr(auth, "JWKS_CACHE_TTL", 0.0)
+        auth._get_jwks("kid-1")
+        assert len(jwks_fetches) == 2
+
+    def test_failed_refresh_keeps_the_cached_keys(self, jwks_fetches, monkeypatch):
+        auth._get_jwks("kid-1")
+        monkeypatch.setattr(auth, "JWKS_CACHE_TTL", 0.0)
+        failures = []
+
+        def fail():
+            failures.append(1)
+            raise ConnectionError("Auth0 is down")
+
+        monkeypatch.setattr(auth, "_fetch_jwks", fail)
+        for _ in range(5):
+            assert auth._get_jwks("kid-1") is KEY
+        assert len(failures) == 1
+
+        # Once the interval has passed, the next request tries again
+        monkeypatch.setitem(auth._JWKS_CACHE, "retry_at", 0.0)
+        monkeypatch.setattr(auth, "_fetch_jwks", lambda: {"kid-2": KEY})
+        assert auth._get_jwks("kid-2") is KEY
+
+
+class TestVerifiedTokenCache:
+    def test_entry_is_served_until_it_expires(self):
+        cache = auth_cache.TTLCache(maxsize=10, ttl=300)
+        cache.set(b"live", {"sub": "a"})
+        assert cache.get(b"live") == {"sub": "a"}
+
+    def test_already_expired_token_is_not_stored(self):
+        """A token past its exp claim arrives with a negative lifetime."""
+        cache = auth_cache.TTLCache(maxsize=10, ttl=300)
+        cache.set(b"gone", {"sub": "b"}, ttl=-1)
+        assert cache.get(b"gone") is None
+
+    def test_size_is_bounded(self):
+        cache = auth_cache.TTLCache(maxsize=3, ttl=300)
+        for index in range(10):
+            cache.set(index, index)
+        assert len(cache) == 3
+        assert cache.get(0) is None
+        assert cache.get(9) == 9
+
+    def test_key_is_not_the_raw_token(self):
+        assert auth_cache.token_key("secret-token") != "secret-token"
+        assert auth_cache.token_key("secret-token") == auth_cache.token_key("secret-token")
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    """A local RSA key pair, published through a stubbed JWKS endpoint."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": "test-kid", "use": "sig"}
+    jwks = {"keys": [public_jwk]}
+
+    monkeypatch.setattr(auth, "_auth0_get", lambda url, **kwargs: jwks)
+    monkeypatch.setattr(auth, "AUTH0_ISSUER", "https://issuer.test/")
+    monkeypatch.setattr(auth, "AUTH0_CONFIGURED", True)
+    monkeypatch.setattr(auth, "API_AUDIENCE", "synapse-api")
+    monkeypatch.setitem(auth._JWKS_CACHE, "keys_by_kid", {})
+    monkeypatch.setitem(auth._JWKS_CACHE, "fetched_at", 0.0)
+    monkeypatch.setitem(auth._JWKS_CACHE, "last_refresh_at", 0.0)
+    monkeypatch.setitem(auth._JWKS_CACHE, "retry_at", 0.0)
+    auth._VERIFIED_TOKENS.clear()
+    yield private_pem
+    auth._VERIFIED_TOKENS.clear()
+
+
+def _sign(private_pem, **claims):
+    claims = {"sub": "auth0|someone", "iss": "https://issuer.test/", "aud": "synapse-api", **claims}
+    claims.setdefault("exp", int(time.time()) + 600)
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": "test-kid"})
+
+
+class TestVerifyDecodeJwt:
+    def test_valid_token_verifies_against_the_prebuilt_key(self, signing_key):
+        payload = real_verify_decode_jwt(_sign(signing_key))
+        assert payload["sub"] == "auth0|someone"
+
+    def test_expired_token_is_rejected(self, signing_key):
+        with pytest.raises(auth.AuthError) as error:
+            real_verify_decode_jwt(_sign(signing_key, exp=int(time.time()) - 60))
+        assert error.value.error["code"] == "token_expired"
+
+    def test_repeat_token_skips_decode(self, signing_key, monkeypatch):
+        token = _sign(signing_key)
+        real_verify_decode_jwt(token)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("jwt.decode ran for a cached token")
+
+        monkeypatch.setattr(auth.jwt, "decode", fail)
+        assert real_verify_decode_jwt(token)["sub"] == "auth0|someone"
+
+    def test_disallowed_algorithm_is_rejected_without_fetching_keys(self, signing_key, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("key set fetched for a token rejectable from its header")
+
+        monkeypatch.setattr(auth, "_fetch_jwks", fail)
+        token = jwt.encode({"sub": "auth0|someone"}, "shared-secret", algorithm="HS256", headers={"kid": "test-kid"})
+        with pytest.raises(auth.AuthError) as error:
+            real_verify_decode_jwt(token)
+        assert error.value.error["code"] == "invalid_header"
+
+    def test_unconfigured_process_rejects_without_network(self, signing_key, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("Auth0 contacted without a configured domain")
+
+        monkeypatch.setattr(auth, "AUTH0_CONFIGURED", False)
+        monkeypatch.setattr(auth, "_auth0_get", fail)
+        with pytest.raises(auth.AuthError) as error:
+            real_verify_decode_jwt(_sign(signing_key))
+        assert error.value.error["code"] == "auth_not_configured"
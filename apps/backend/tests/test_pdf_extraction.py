@@ -0,0 +1,199 @@
+import pytest
+
+
+@pytest.fixture(params=["mupdf", "pypdf2"])
+def pdf_extraction(request, monkeypatch):
+    """The module, extracting with each PDF library in turn."""
+    import pdf_extraction
+
+    if request.param == "mupdf":
+        if not pdf_extraction.HAS_PYMUPDF:
+            pytest.skip("PyMuPDF is not installed")
+    else:
+        if not pdf_extraction.HAS_PYPDF2:
+            pytest.skip("PyPDF2 is not installed")
+        monkeypatch.setattr(pdf_extraction, "HAS_PYMUPDF", False)
+    return pdf_extraction
+
+
+class TestPdfExtraction:
+    def test_text_is_extracted_page_by_page(self, pdf_extraction, sample_pdf):
+        text, error = pdf_extraction.extract_pdf_text(sample_pdf)
+
+        assert error is None
+        assert text.startswith("Page 1:\nTest PDF Document")
+        assert "Keywords: testing, extraction, PDF, content" in text
+
+    def test_file_is_extracted_from_its_path(self, pdf_extraction, sample_pdf, tmp_path):
+        stored = tmp_path / "report.pdf"
+        stored.write_bytes(sample_pdf)
+
+        assert pdf_extraction.extract_pdf_file(stored) == pdf_extraction.extract_pdf_text(sample_pdf)
+
+    def test_corrupt_pdf_is_reported(self, pdf_extraction):
+        text, error = pdf_extraction.extract_pdf_text(b"%PDF-1.4\nnot a document")
+
+        assert text is None
+        assert error
+
+    def test_page_limit_is_enforced(self, pdf_extraction, sample_pdf, monkeypatch):
+        monkeypatch.setattr(pdf_extraction, "MAX_PDF_PAGES", 0)
+
+        text, error = pdf_extraction.extract_pdf_text(sample_pdf)
+
+        assert text is None
+        assert "(max 0)" in error
+
+
+class TestExtractionQueue:
+    def test_document_is_extracted_in_a_worker_process(self, app, upload_dir, sample_pdf):
+        import time
+
+        from database import db
+        from models import FileSystemItem, User
+
+        import text_extractor
+
+        user = User.query.filter_by(auth0_id="auth0|owner").first()
+        item = FileSystemItem(name="report.pdf", type="file", owner_id=user.id, mime_type="application/pdf")
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+        stored = upload_dir / f"{item_id}.pdf"
+        stored.write_bytes(sample_pdf)
+        db.session.remove()
+
+        extraction_queue = text_extractor.TextExtractionQueue(app, workers=1)
+        extraction_queue.start()
+        try:
+            assert extraction_queue.add_job(item_id, str(stored))
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                item = db.session.get(FileSystemItem, item_id)
+                if item.content_extracted or item.extraction_error:
+                    break
+                db.session.remove()
+                time.sleep(0.05)
+        finally:
+            extraction_queue.stop()
+
+        assert item.extraction_error is None
+        assert item.content_extracted
+        assert "Test PDF Document" in item.content_text
+
+    def test_results_are_recorded_together_when_the_queue_stops(self, app):
+        from database import db
+        from models import FileSystemItem, User
+
+        import text_extractor
+
+        user = User.query.filter_by(auth0_id="auth0|owner").first()
+        extracted = FileSystemItem(name="a.pdf", type="file", owner_id=user.id, mime_type="application/pdf")
+        failed = FileSystemItem(
+            name="b.pdf", type="file", owner_id=user.id, mime_type="application/pdf", content_text="earlier text"
+        )
+        db.session.add_all([extracted, failed])
+        db.session.commit()
+        extracted_id, failed_id = extracted.id, failed.id
+        db.session.remove()
+
+        extraction_queue = text_extractor.TextExtractionQueue(app, workers=1)
+        extraction_queue._update_extraction_status(extracted_id, True, content_text="Page 1:\nhello")
+        extraction_queue._update_extraction_status(failed_id, False, "PDF is encrypted")
+        extraction_queue._update_extraction_status(failed_id + 1000, False, "PDF is encrypted")
+        extraction_queue.stop()
+
+        extracted = db.session.get(FileSystemItem, extracted_id)
+        assert extracted.content_extracted
+        assert extracted.content_text == "Page 1:\nhello"
+
+        failed = db.session.get(FileSystemItem, failed_id)
+        assert not failed.content_extracted
+        assert failed.extraction_error == "PDF is encrypted"
+        assert failed.content_text == "earlier text"
+
+    def test_file_stays_in_flight_until_its_result_is_committed(self, app):
+        from concurrent.futures import Future
+
+        from database import db
+        from models import FileSystemItem, User
+
+        import text_extractor
+
+        user = User.query.filter_by(auth0_id="auth0|owner").first()
+        item = FileSystemItem(name="a.pdf", type="file", owner_id=user.id, mime_type="application/pdf")
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+        db.session.remove()
+
+        extraction_queue = text_extractor.TextExtractionQueue(app, workers=1)
+        extraction_queue.slots.acquire()
+        extraction_queue.in_flight.add(item_id)
+        future = Future()
+        future.set_result(("Page 1:\nhello", None))
+        extraction_queue._extraction_done(item_id, future)
+
+        # The worker's slot is free, but the row is not written yet
+        assert extraction_queue.slots.acquire(blocking=False)
+        assert item_id in extraction_queue.in_flight
+
+        extraction_queue.stop()
+
+        assert item_id not in extraction_queue.in_flight
+        assert db.session.get(FileSystemItem, item_id).content_extracted
+
+    def test_broken_pool_is_shut_down_when_replaced(self, app, monkeypatch):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        import text_extractor
+
+        class BrokenPool:
+            shutdowns = []
+
+            def submit(self, fn, *args):
+                raise BrokenProcessPool("a worker died")
+
+            def shutdown(self, **kwargs):
+                self.shutdowns.append(kwargs)
+
+        class FreshPool:
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(("text", None))
+                return future
+
+        extraction_queue = text_extractor.TextExtractionQueue(app, workers=1)
+        extraction_queue.pool = BrokenPool()
+        monkeypatch.setattr(extraction_queue, "_new_pool", FreshPool)
+        extraction_queue._submit(1, b"%PDF-")
+
+        assert BrokenPool.shutdowns == [{"wait": False, "cancel_futures": True}]
+        assert isinstance(extraction_queue.pool, FreshPool)
+
+
+class TestExtractionService:
+    def test_responses_are_encoded_with_orjson(self, monkeypatch):
+        import serialization
+        import text_extractor
+
+        if not serialization.HAS_ORJSON:
+            pytest.skip("orjson is not installed")
+
+        calls = []
+        orjson_dumps = serialization.orjson.dumps
+
+        def counting_dumps(*args, **kwargs):
+            calls.append(args)
+            return orjson_dumps(*args, **kwargs)
+
+        monkeypatch.setattr(serialization.orjson, "dumps", counting_dumps)
+        monkeypatch.setenv("DATABASE_URL", "sqlite://")
+        # create_extraction_app installs its queue as the module's own
+        monkeypatch.setattr(text_extractor, "extraction_queue", None)
+
+        response = text_extractor.create_extraction_app().test_client().get("/health")
+
+        assert response.get_json() == {"status": "healthy", "queue_size": 0}
+        assert calls
@@ -0,0 +1,57 @@
+"""Spooling of uploaded files, with the content hash taken on the way in.
+
+Werkzeug parses a multipart body as it arrives and writes each file part into a
+spool: memory for small files, a temporary file past 500 KB. Uploads need the
+SHA-256 of those bytes, and reading the spool back just to hash it is a second
+full pass over up to 100 MB. Hashing each chunk as it is written into the spool
+costs nothing extra, because the bytes are already in hand.
+
+The size limit is enforced the same way. With MAX_CONTENT_LENGTH set, Werkzeug
+stops reading once that many bytes have arrived, including for a chunked body
+with no Content-Length to check up front.
+"""
+
+import hashlib
+
+from flask import Request
+from werkzeug.formparser import default_stream_factory
+
+MAX_FILE_SIZE = 100 * 1024 * 1024
+# Room for the multipart framing and form fields around the file. A request
+# larger than this is refused from its Content-Length, before any of the body is
+# parsed or spooled to disk.
+MAX_UPLOAD_REQUEST_SIZE = MAX_FILE_SIZE + 1024 * 1024
+
+
+class DigestingFile:
+    """A spool for an uploaded file that hashes what is written into it.
+
+    Everything else is passed through to the underlying spool, so the upload
+    code reads, seeks and takes fileno() from it as it would from the spool.
+    """
+
+    def __init__(self, spool):
+        self._spool = spool
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        return self._spool.write(data)
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of everything written so far."""
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._spool, name)
+
+    def __iter__(self):
+        return iter(self._spool)
+
+
+class UploadRequest(Request):
+    """The request class for the services, spooling file parts into DigestingFile."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return DigestingFile(default_stream_factory(total_content_length, content_type, filename, content_length))
@@ -5,6 +5,7 @@ Utility functions for file handling and validation
 import os
 import re
 import unicodedata
+from itertools import islice
 from typing import Optional, Tuple
 
 from werkzeug.utils import secure_filename
@@ -37,6 +38,9 @@ WINDOWS_RESERVED_NAMES = {
 
 # Dangerous characters that should be removed/escaped
 DANGEROUS_CHARS = r'[<>:"/\\|?*\x00-\x1f]'
+_DANGEROUS_RE = re.compile(DANGEROUS_CHARS)
+# The same characters, as a table for str.translate to delete them in one pass
+_DANGEROUS_DELETE_TABLE = dict.fromkeys([*range(0x20), *map(ord, '<>:"/\\|?*')])
 DANGEROUS_CHAR_MAP = {
     "<": "_lt_",
     ">": "_gt_",
@@ -49,6 +53,15 @@ DANGEROUS_CHAR_MAP = {
     "*": "_asterisk_",
 }
 
+# Text that is nothing but one of these placeholders is not meaningful content.
+# One alternation, matched case-insensitively, so the text is neither lowercased
+# into a copy nor scanned once per placeholder.
+_PLACEHOLDER_RE = re.compile(
+    r"\s*(?:fill?\s*out?\s*this?\s*form?|placeholder|dummy|lorem ipsum|this is a test)\s*",
+    re.IGNORECASE,
+)
+_NON_WHITESPACE_RE = re.compile(r"\S")
+
 
 def sanitize_filename(filename: str, max_length: int = 255) -> str:
     """
@@ -68,7 +81,7 @@ def sanitize_filename(filename: str, max_length: int = 255) -> str:
     normalized = unicodedata.normalize("NFKD", filename)
 
     # Remove control characters and dangerous characters
-    sanitized = re.sub(DANGEROUS_CHARS, "", normalized)
+    sanitized = normalized.translate(_DANGEROUS_DELETE_TABLE)
 
     # Handle Windows reserved names
     name_without_ext, ext = os.path.splitext(sanitized)
@@ -116,10 +129,11 @@ def truncate_filename(filename: str, max_length: int = 255) -> str:
         # Extension alone is too long, fallback
         return f"file{ext[:max_length-4]}" if ext else "file"
 
-    # Truncate the base name
-    truncated_name = name_without_ext
-    while len(truncated_name.encode("utf-8")) > available_bytes and len(truncated_name) > 1:
-        truncated_name = truncated_name[:-1]
+    # Truncate the base name to its longest prefix that fits, in one slice of its
+    # encoding. Decoding drops a character cut in two at the end; at least the
+    # first character is kept, even if it alone is too long.
+    truncated_name = name_without_ext.encode("utf-8")[:available_bytes].decode("utf-8", errors="ignore")
+    truncated_name = truncated_name or name_without_ext[:1]
 
     # Add ellipsis and extension
     if len(truncated_name) < len(name_without_ext):
@@ -162,7 +176,7 @@ def validate_filename(filename: str, max_length: int = 255) -> Tuple[bool, Optio
         return False, "Filename cannot contain directory traversal sequences"
 
     # Check for dangerous characters
-    if re.search(DANGEROUS_CHARS, filename):
+    if _DANGEROUS_RE.search(filename):
         return False, "Filename contains invalid characters"
 
     # Check for Windows reserved names
@@ -238,23 +252,11 @@ def has_meaningful_content(text: str, min_chars: int = 10) -> bool:
     if not text:
         return False
 
-    # Remove whitespace and check length
-    stripped = re.sub(r"\s+", "", text)
-    if len(stripped) < min_chars:
+    # Count non-whitespace characters, stopping at min_chars rather than
+    # copying the whole text, a document's worth for an extracted PDF, without
+    # its whitespace
+    if sum(1 for _ in islice(_NON_WHITESPACE_RE.finditer(text), min_chars)) < min_chars:
         return False
 
     # Check for common placeholder patterns
-    placeholder_patterns = [
-        r"^\s*fill?\s*out?\s*this?\s*form?\s*$",
-        r"^\s*placeholder\s*$",
-        r"^\s*dummy\s*$",
-        r"^\s*lorem ipsum\s*$",
-        r"^\s*this is a test\s*$",
-    ]
-
-    text_lower = text.lower().strip()
-    for pattern in placeholder_patterns:
-        if re.match(pattern, text_lower):
-            return False
-
-    return True
+    return _PLACEHOLDER_RE.fullmatch(text) is None
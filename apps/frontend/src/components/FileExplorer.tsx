@@ -10,6 +10,9 @@ import {
   truncateFilename,
 } from '../utils/validation';
 
+// Uploads sent at once from a multi-file selection.
+const PARALLEL_UPLOADS = 4;
+
 interface FileExplorerProps {
   items: FileSystemItem[];
   currentFolderId: number | null;
@@ -86,6 +89,8 @@ export const FileExplorer = ({
     let errorCount = 0;
 
     try {
+      const pending: { file: File; formData: FormData }[] = [];
+
       for (let i = 0; i < files.length; i++) {
         const file = files[i];
 
@@ -119,19 +124,33 @@ export const FileExplorer = ({
         if (currentFolderId !== null) {
           formData.append('parent_id', currentFolderId.toString());
         }
+        pending.push({ file, formData });
+      }
 
-        try {
-          const uploadedFile = await filesystemApi.uploadFile(formData);
-          itemsActions.addItem(uploadedFile);
-          successCount++;
-        } catch (err: unknown) {
-          const errorMessage =
-            (err as { response?: { data?: { error?: string } } })?.response
-              ?.data?.error || 'Failed to upload file';
-          toast.error(`${file.name}: ${errorMessage}`);
-          errorCount++;
+      // A few uploads in flight at once rather than one after another, so a
+      // multi-file selection takes about as long as its largest files instead
+      // of the sum of every round trip.
+      const uploadNext = async () => {
+        for (let next = pending.shift(); next; next = pending.shift()) {
+          try {
+            const uploadedFile = await filesystemApi.uploadFile(next.formData);
+            itemsActions.addItem(uploadedFile);
+            successCount++;
+          } catch (err: unknown) {
+            const errorMessage =
+              (err as { response?: { data?: { error?: string } } })?.response
+                ?.data?.error || 'Failed to upload file';
+            toast.error(`${next.file.name}: ${errorMessage}`);
+            errorCount++;
+          }
         }
-      }
+      };
+      await Promise.all(
+        Array.from(
+          { length: Math.min(PARALLEL_UPLOADS, pending.length) },
+          uploadNext
+        )
+      );
 
       if (successCount > 0) {
         toast.success(
@@ -40,9 +40,16 @@ export interface SearchPagination {
   current_page: number;
   total_pages: number;
   total_items: number;
+  total_is_estimate: boolean;
   items_per_page: number;
   has_next: boolean;
   has_prev: boolean;
+  next_cursor: SearchCursor | null;
+}
+
+export interface SearchCursor {
+  after_name: string;
+  after_id: string;
 }
 
 export interface SearchFilters {